@@ -0,0 +1,9 @@
+#!/bin/sh
+# Схема и таблицы кэшей в БД обновляются при каждом старте контейнера,
+# затем процесс заменяется командой из CMD (gunicorn).
+set -e
+
+python manage.py migrate --noinput
+python manage.py createcachetable
+
+exec "$@"
@@ -0,0 +1,55 @@
+"""
+Конфигурация gunicorn для production-профиля.
+
+WSGI:  gunicorn -c gunicorn.conf.py test_dl.wsgi
+ASGI:  GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \
+       gunicorn -c gunicorn.conf.py test_dl.asgi
+"""
+import glob
+import multiprocessing
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# По умолчанию 2 * ядра + 1 воркер, WEB_CONCURRENCY переопределяет.
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * multiprocessing.cpu_count() + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Периодический перезапуск воркеров ограничивает рост памяти.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Приложение загружается до fork: воркеры делят память и стартуют быстрее.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() in ('true', '1')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', None)
+errorlog = '-'
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def on_starting(server):
+    """
+    Файлы метрик прошлого запуска (в том числе от других pid) удаляются.
+    Предупреждение, если у нескольких воркеров кэш в памяти процесса.
+    """
+
+    if server.cfg.workers > 1 and os.getenv('CACHE_BACKEND', LOCMEM) == LOCMEM:
+        server.log.warning(
+            'CACHE_BACKEND is LocMemCache with %s workers: cached responses '
+            'and search pages are not shared and go stale '
+            'in other workers; set CACHE_BACKEND to Redis or the database cache',
+            server.cfg.workers
+        )
+
+    directory = os.getenv('METRICS_DIR', '')
+
+    for path in glob.glob(os.path.join(directory, '*.db')) if directory else ():
+        os.remove(path)
@@ -18,6 +18,7 @@ def main():
 
     if 'runserver' in sys.argv:
         execute_from_command_line(['./manage.py', 'migrate'])
+        execute_from_command_line(['./manage.py', 'createcachetable'])
         execute_from_command_line(['./manage.py', 'test'])
 
     execute_from_command_line(sys.argv)
@@ -0,0 +1,253 @@
+"""
+Нативные async-представления для запуска под test_dl/asgi.py. Django 4.0
+не поддерживает async в классах-представлениях и в ORM, поэтому это
+функции, а обращения к БД идут через sync_to_async. Аутентификация
+использует JWTAuthentication.aauthenticate и при попадании в кэши
+обходится без перехода в поток.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.hashers import make_password
+from django.http import HttpResponse, HttpResponseNotAllowed
+
+from rest_framework import exceptions, status
+from rest_framework.serializers import as_serializer_error
+
+from .backends import JWTAuthentication, TokenUser
+from .hashing import hashing_pool, verify_password
+from .models import User, Passport
+from .metrics import password_hash_duration
+from .queries import query_budget
+from .routers import read_from_replica
+from .renders import dumps
+from .pagination import get_layout
+from .sqlite import write_queue
+from .serializers import (
+    RegistrationSerializer, LoginSerializer, UserSerializer,
+    UserAdminSerializer, PassportCreateSerializer, PassportSerializer
+)
+from .views import PassportAPIView, PassportsApiView
+
+
+authentication = JWTAuthentication()
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(dumps(data), status=status_code, content_type='application/json')
+
+
+def error_response(exc):
+    """ Ответ в формате core_exception_handler. """
+
+    if isinstance(exc, exceptions.ValidationError):
+        return json_response(
+            {'errors': as_serializer_error(exc)},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    status_code = exc.status_code
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # Как в DRF: у JWTAuthentication нет authenticate_header, поэтому 403.
+        status_code = status.HTTP_403_FORBIDDEN
+
+    response = json_response({'detail': exc.detail}, status_code=status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+
+    return response
+
+
+def async_api_view(methods, authenticated=False, staff=False):
+    """
+    Аналог csrf_exempt, require_http_methods и проверок прав DRF для
+    async-функций: декораторы Django 4.0 прячут корутину, и представление
+    перестаёт считаться async. Исключения DRF превращаются в ответы.
+    """
+
+    def decorator(view):
+        async def wrapped_view(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+
+            try:
+                if authenticated:
+                    user_auth = await authentication.aauthenticate(request)
+
+                    if user_auth is None:
+                        raise exceptions.NotAuthenticated()
+                    if staff and not user_auth[0].is_staff:
+                        raise exceptions.PermissionDenied()
+
+                    request.user, request.auth = user_auth
+
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as e:
+                return error_response(e)
+
+        wrapped_view.csrf_exempt = True
+        wrapped_view.__name__ = view.__name__
+        wrapped_view.__doc__ = view.__doc__
+
+        return wrapped_view
+
+    return decorator
+
+
+def parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise exceptions.ValidationError({'error': ['JSON parse error']})
+
+    if not isinstance(data, dict):
+        raise exceptions.ValidationError({'error': ['Expected a JSON object']})
+
+    return data
+
+
+async def load_user(request):
+    """ Stateless-пользователя нужно загрузить до обращения к его полям. """
+
+    if isinstance(request.user, TokenUser):
+        await request.user.aload()
+
+    return request.user
+
+
+def get_object(model, object_id):
+    try:
+        return model.objects.get(id=object_id)
+    except model.DoesNotExist as e:
+        raise exceptions.NotFound(detail=str(e))
+
+
+@query_budget(2)
+@async_api_view(['POST'])
+async def login(request):
+    """ Асинхронный вариант AuthenticationAPIView.post. """
+
+    serializer = LoginSerializer()
+
+    data = serializer.to_internal_value(parse_body(request))
+    username, password = serializer.get_credentials(data)
+    user = await sync_to_async(serializer.get_user)(username)
+
+    with password_hash_duration.time(operation='verify'):
+        valid, must_update = await hashing_pool.arun(
+            verify_password, password, user.password if user else None
+        )
+
+    if valid and must_update:
+        with password_hash_duration.time(operation='rehash'):
+            user.password = await hashing_pool.arun(make_password, password)
+        await sync_to_async(user.save)(update_fields=['password'])
+
+    login_data = serializer.get_login_data(user, valid)
+
+    return json_response(LoginSerializer(login_data).data)
+
+
+@query_budget(3)
+@async_api_view(['POST'])
+async def registration(request):
+    """ Асинхронный вариант RegistrationAPIView.post. """
+
+    serializer = RegistrationSerializer(data=parse_body(request))
+    serializer.is_valid(raise_exception=True)
+
+    validated_data = dict(serializer.validated_data)
+    password_hash = await hashing_pool.arun(make_password, validated_data.pop('password'))
+
+    serializer.instance = await sync_to_async(User.objects.create_user)(
+        password_hash=password_hash,
+        **validated_data
+    )
+
+    return json_response(serializer.data, status_code=status.HTTP_201_CREATED)
+
+
+@query_budget({'GET': 1, 'PUT': 4, 'PATCH': 4})
+@async_api_view(['GET', 'PUT', 'PATCH'], authenticated=True)
+async def current_user(request):
+    """ Асинхронный вариант UserRetrieveUpdateAPIView. """
+
+    user = await load_user(request)
+
+    if request.method == 'GET':
+        return json_response(UserSerializer(user).data)
+
+    serializer = UserSerializer(user, data=parse_body(request), partial=True)
+
+    def save():
+        # Проверки уникальности username и email обращаются к БД.
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return serializer.data
+
+    return json_response(await sync_to_async(save)())
+
+
+@query_budget({'GET': 2, 'DELETE': 6})
+@async_api_view(['GET', 'DELETE'], authenticated=True, staff=True)
+async def user_admin(request, user_id):
+    """ Асинхронный вариант UserAdminAPIView. """
+
+    user = await sync_to_async(get_object)(User, user_id)
+
+    if request.method == 'GET':
+        return json_response(UserAdminSerializer(user).data)
+
+    await sync_to_async(write_queue.run)(user.delete)
+
+    return json_response({})
+
+
+@query_budget({'GET': 3, 'POST': 2})
+@async_api_view(['GET', 'POST'], authenticated=True)
+async def passports(request):
+    """ Асинхронный вариант PassportsApiView. """
+
+    if request.method == 'POST':
+        serializer = PassportCreateSerializer(data=parse_body(request))
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.save)()
+
+        return json_response(serializer.data, status_code=status.HTTP_201_CREATED)
+
+    with read_from_replica(request):
+        data = await sync_to_async(PassportsApiView.search_page)(request.GET, get_layout(request))
+
+    return json_response(data)
+
+
+@query_budget({'GET': 2, 'PATCH': 3, 'DELETE': 3})
+@async_api_view(['GET', 'PATCH', 'DELETE'], authenticated=True)
+async def passport(request, passport_id):
+    """ Асинхронный вариант PassportAPIView. """
+
+    if request.method == 'GET':
+        with read_from_replica(request):
+            not_modified, etag, data = await sync_to_async(PassportAPIView.passport_data)(
+                request, passport_id
+            )
+
+        if not_modified is not None:
+            return not_modified
+
+        return PassportAPIView.patch_response(json_response(data), etag)
+
+    instance = await sync_to_async(get_object)(Passport, passport_id)
+
+    if request.method == 'DELETE':
+        await sync_to_async(write_queue.run)(instance.delete)
+
+        return json_response({})
+
+    serializer = PassportSerializer(instance, data=parse_body(request), partial=True)
+    serializer.is_valid(raise_exception=True)
+    await sync_to_async(serializer.save)()
+
+    return json_response(serializer.data)
@@ -1,10 +1,99 @@
-import jwt
-
 from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import LazyObject, empty
 
 from rest_framework import authentication, exceptions
 
 from .models import User
+from .caches import user_cache, token_cache
+from .metrics import jwt_authentications
+
+
+STATELESS_CLAIMS = ('id', 'username', 'is_staff', 'is_active', 'ver')
+
+
+def user_state_key(user_id):
+    return f'jwt_user_state:{user_id}'
+
+
+def state_cache():
+    """
+    Кэш состояний пользователей (JWT_STATE_CACHE): общий для всех воркеров
+    и без вытеснения, иначе потерянная запись снова делает отозванный
+    токен действительным.
+    """
+    return caches[settings.JWT_STATE_CACHE]
+
+
+def remember_user_state(user_id, token_version=None, is_active=False, is_staff=False):
+    """
+    Запоминает актуальное состояние пользователя для проверки токенов
+    в stateless-режиме. Удалённый пользователь сохраняется как неактивный.
+    """
+    state_cache().set(
+        user_state_key(user_id),
+        (token_version, is_active, is_staff),
+        settings.JWT_REVOCATION_TTL
+    )
+
+
+class TokenUser(LazyObject):
+    """
+    Пользователь, собранный из подписанных claims токена. Поля id, username,
+    is_staff и is_active доступны без запроса к БД; обращение к любому
+    другому атрибуту загружает пользователя из БД.
+    """
+
+    def __init__(self, payload):
+        self.__dict__['_claims'] = payload
+        super().__init__()
+
+    def _setup(self):
+        try:
+            self._wrapped = user_cache.get(self._claims['id'])
+        except User.DoesNotExist:
+            msg = 'Пользователь соответствующий данному токену не найден'
+            jwt_authentications.inc(outcome='user_missing')
+            raise exceptions.AuthenticationFailed(msg)
+
+    async def aload(self):
+        """ Загрузка пользователя из async-кода, где _setup вызывать нельзя. """
+
+        if self._wrapped is not empty:
+            return
+
+        try:
+            self._wrapped = await user_cache.aget(self._claims['id'])
+        except User.DoesNotExist:
+            msg = 'Пользователь соответствующий данному токену не найден'
+            jwt_authentications.inc(outcome='user_missing')
+            raise exceptions.AuthenticationFailed(msg)
+
+    def _claim(self, name):
+        if self._wrapped is empty:
+            return self._claims[name]
+
+        return getattr(self._wrapped, name)
+
+    id = pk = property(lambda self: self._claim('id'))
+    username = property(lambda self: self._claim('username'))
+    is_staff = property(lambda self: self._claim('is_staff'))
+    is_active = property(lambda self: self._claim('is_active'))
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
+    def __str__(self):
+        return self.username
+
+    def __copy__(self):
+        return type(self)(self._claims)
+
+    def __deepcopy__(self, memo):
+        return type(self)(dict(self._claims))
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -26,6 +115,43 @@ class JWTAuthentication(authentication.BaseAuthentication):
             AuthenticationFailed и позволим DRF сделать все остальное.
         """
         request.user = None
+        token = self.get_token(request)
+
+        if token is None:
+            return None
+
+        return self._authenticate_credentials(request, token)
+
+    async def aauthenticate(self, request):
+        """
+        Async-вариант authenticate для нативных async-представлений:
+        токен и пользователь берутся из кэшей без перехода в поток,
+        к БД через sync_to_async идём только при промахе.
+        """
+        token = self.get_token(request)
+
+        if token is None:
+            return None
+
+        payload = self._decode(token)
+
+        if settings.JWT_STATELESS and all(claim in payload for claim in STATELESS_CLAIMS):
+            # Кэш состояний может быть в БД: только через async API кэша.
+            state = await state_cache().aget(user_state_key(payload['id']))
+            return self._authenticate_claims(payload, token, state)
+
+        try:
+            user = await user_cache.aget(payload['id'])
+        except User.DoesNotExist:
+            msg = 'Пользователь соответствующий данному токену не найден'
+            jwt_authentications.inc(outcome='user_missing')
+            raise exceptions.AuthenticationFailed(msg)
+
+        return self._check_user(user, payload, token)
+
+    def get_token(self, request):
+        """ Токен из заголовка Authorization или None. """
+
         auth_header = authentication.get_authorization_header(request).split()
         auth_header_prefix = self.authentication_header_prefix.lower()
 
@@ -44,27 +170,78 @@ class JWTAuthentication(authentication.BaseAuthentication):
         if prefix.lower() != auth_header_prefix:
             return None
 
-        return self._authenticate_credentials(request, token)
+        return token
+
+    @staticmethod
+    def _decode(token):
+        try:
+            return token_cache.decode(token)
+        except Exception:
+            msg = 'Ошибка аутентификации. Невозможно декодировать токен'
+            jwt_authentications.inc(outcome='decode_failure')
+            raise exceptions.AuthenticationFailed(msg)
 
     def _authenticate_credentials(self, request, token):
         """
         Попытка аутентификации с предоставленными данными. Если успешно -
         вернуть пользователя и токен, иначе - сгенерировать исключение.
         """
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY)
-        except Exception:
-            msg = 'Ошибка аутентификации. Невозможно декодировать токен'
-            raise exceptions.AuthenticationFailed(msg)
+        payload = self._decode(token)
+
+        if settings.JWT_STATELESS and all(claim in payload for claim in STATELESS_CLAIMS):
+            state = state_cache().get(user_state_key(payload['id']))
+            return self._authenticate_claims(payload, token, state)
 
         try:
-            user = User.objects.get(pk=payload['id'])
+            user = user_cache.get(payload['id'])
         except User.DoesNotExist:
             msg = 'Пользователь соответствующий данному токену не найден'
+            jwt_authentications.inc(outcome='user_missing')
             raise exceptions.AuthenticationFailed(msg)
 
+        return self._check_user(user, payload, token)
+
+    @staticmethod
+    def _check_user(user, payload, token):
         if not user.is_active:
             msg = 'Данный пользователь не активен'
+            jwt_authentications.inc(outcome='inactive')
+            raise exceptions.AuthenticationFailed(msg)
+
+        if payload.get('ver', user.token_version) != user.token_version:
+            msg = 'Токен отозван'
+            jwt_authentications.inc(outcome='revoked')
             raise exceptions.AuthenticationFailed(msg)
 
-        return (user, token)
\ No newline at end of file
+        jwt_authentications.inc(outcome='success')
+
+        return (user, token)
+
+    @staticmethod
+    def _authenticate_claims(payload, token, state):
+        """
+        Аутентификация без запроса к БД: доверяем подписанным claims, если
+        по state из кэша состояний пользователь не был недавно деактивирован,
+        удалён, не сменил версию токена и не потерял или получил права staff.
+        """
+        if state is not None:
+            token_version, is_active, is_staff = state
+
+            if not is_active:
+                msg = 'Данный пользователь не активен'
+                jwt_authentications.inc(outcome='inactive')
+                raise exceptions.AuthenticationFailed(msg)
+
+            if token_version != payload['ver'] or is_staff != payload['is_staff']:
+                msg = 'Токен отозван'
+                jwt_authentications.inc(outcome='revoked')
+                raise exceptions.AuthenticationFailed(msg)
+
+        if not payload['is_active']:
+            msg = 'Данный пользователь не активен'
+            jwt_authentications.inc(outcome='inactive')
+            raise exceptions.AuthenticationFailed(msg)
+
+        jwt_authentications.inc(outcome='success')
+
+        return (TokenUser(payload), token)
\ No newline at end of file
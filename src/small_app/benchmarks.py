@@ -0,0 +1,267 @@
+import asyncio
+import http.client
+import json
+import math
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def percentile(values, percent):
+    """ Перцентиль по методу ближайшего ранга, values должны быть отсортированы. """
+
+    if not values:
+        return None
+
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+
+    return values[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """ Сводка по замеру: пропускная способность и задержки в миллисекундах. """
+
+    latencies = sorted(latencies)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50': round(1000 * percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(1000 * percentile(latencies, 95), 3) if latencies else None,
+            'p99': round(1000 * percentile(latencies, 99), 3) if latencies else None,
+            'max': round(1000 * latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+async def run_load(send, total, concurrency):
+    """
+    Выполняет total вызовов корутины send() не более чем по concurrency
+    одновременно. send возвращает True при успешном ответе.
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+
+        for _ in remaining:
+            started = time.perf_counter()
+            ok = await send()
+            latencies.append(time.perf_counter() - started)
+
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_http_load(base_url, make_request, total, concurrency, ok_statuses=(200, 201)):
+    """
+    Нагрузка на запущенный сервер из concurrency потоков, у каждого своё
+    keep-alive соединение. make_request(номер) возвращает
+    (method, path, body, headers). В сводку добавляется число ответов
+    по статусам, сетевые ошибки считаются как status 0.
+    """
+    parsed = urlparse(base_url)
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    errors = 0
+
+    def worker():
+        nonlocal errors
+
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                break
+
+            method, path, body, headers = make_request(number)
+            started = time.perf_counter()
+
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+                status = 0
+
+            elapsed = time.perf_counter() - started
+
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+                if status not in ok_statuses:
+                    errors += 1
+
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = summarize(latencies, time.perf_counter() - started, errors)
+    summary['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+
+    return summary
+
+
+def request_json(base_url, method, path, data=None, headers=None):
+    """ Одиночный JSON-запрос к серверу, возвращает (status, тело). """
+
+    parsed = urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+
+    try:
+        connection.request(method, path, body=body, headers={
+            'Content-Type': 'application/json', **(headers or {})
+        })
+        response = connection.getresponse()
+        content = response.read()
+    finally:
+        connection.close()
+
+    try:
+        return response.status, json.loads(content or b'null')
+    except ValueError:
+        return response.status, None
+
+
+SERVER_MODES = ('runserver', 'wsgi', 'asgi')
+
+
+def server_command(mode, bind, gunicorn_config):
+    """
+    Команда и окружение для запуска сервера из src/: runserver, gunicorn
+    (WSGI) или gunicorn + uvicorn (ASGI) в production-профиле.
+    """
+    production_env = {
+        'DJANGO_ENV': 'production',
+        'SECRET_KEY': secrets.token_urlsafe(50),
+        'ALLOWED_HOSTS': '127.0.0.1',
+        'GUNICORN_BIND': bind,
+    }
+
+    if mode == 'runserver':
+        return (
+            [sys.executable, 'manage.py', 'runserver', '--noreload', bind],
+            {'DJANGO_ENV': 'development'}
+        )
+
+    if mode == 'wsgi':
+        return ['gunicorn', '-c', gunicorn_config, 'test_dl.wsgi'], production_env
+
+    return (
+        ['gunicorn', '-c', gunicorn_config, 'test_dl.asgi'],
+        {**production_env, 'GUNICORN_WORKER_CLASS': 'uvicorn.workers.UvicornWorker'}
+    )
+
+
+def git_revision(cwd=None):
+    """ Текущий коммит для отчёта или None вне git-репозитория. """
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, report, max_regression):
+    """
+    Сравнивает отчёты benchmark_endpoints по общим эндпоинтам: изменение
+    p95 и пропускной способности в процентах. Регрессия - рост p95 или
+    падение rps больше чем на max_regression процентов.
+    """
+
+    def change(old, new):
+        if not old or new is None:
+            return None
+        return round(100 * (new - old) / old, 1)
+
+    comparison = {}
+    for name, summary in report['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if not old or 'error' in old or 'error' in summary:
+            continue
+
+        p95 = change(old['latency_ms']['p95'], summary['latency_ms']['p95'])
+        throughput = change(old['throughput_rps'], summary['throughput_rps'])
+
+        comparison[name] = {
+            'p95_change_percent': p95,
+            'throughput_change_percent': throughput,
+            'regression': (
+                (p95 is not None and p95 > max_regression)
+                or (throughput is not None and -throughput > max_regression)
+            ),
+        }
+
+    return comparison
+
+
+@contextmanager
+def launch_server(command, base_url, env=None, cwd=None, timeout=30):
+    """ Запускает сервер командой command и ждёт, пока он начнёт отвечать. """
+
+    process = subprocess.Popen(
+        command,
+        env={**os.environ, **(env or {})},
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    parsed = urlparse(base_url)
+
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {process.returncode}: {command}')
+
+            try:
+                socket.create_connection((parsed.hostname, parsed.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'Server did not start in {timeout} seconds: {command}')
+                time.sleep(0.2)
+
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,390 @@
+import hashlib
+import json
+import threading
+import time
+
+from collections import OrderedDict
+
+import jwt
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import cache_requests
+
+
+class LRUCache:
+    """
+    Ограниченный LRU-кэш в памяти процесса с TTL записей. Потокобезопасен,
+    ведёт счётчики попаданий и промахов; с name они идут и в метрики.
+    """
+
+    def __init__(self, maxsize, ttl, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, None)
+
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                item = None
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+
+        if self.name is not None:
+            cache_requests.inc(cache=self.name, result='miss' if item is None else 'hit')
+
+        return default if item is None else item[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def get_generation(key):
+    """ Текущее поколение из общего кэша Django. """
+
+    value = cache.get(key)
+
+    if value is None:
+        # Вытесненный счётчик начинается с нового значения,
+        # чтобы не совпасть с поколением уже сохранённых записей.
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+
+    return value
+
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+class UserCache:
+    """
+    Двухуровневый кэш пользователей для JWTAuthentication: LRU в памяти
+    воркера поверх общего кэша Django. Хранятся только поля из
+    cached_fields() (без хэша пароля), пользователь собирается заново
+    на каждый запрос.
+
+    Ключ в общем кэше содержит поколение пользователя, которое сигналы
+    post_save/post_delete увеличивают. Запись, прочитанная из БД до
+    изменения, сохраняется под старым поколением и больше не находится.
+    В других воркерах локальная копия живёт не дольше USER_CACHE_LOCAL_TTL
+    секунд. Общий уровень выключен (USER_CACHE_SHARED), если кэш Django
+    не общий для воркеров.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(
+            settings.USER_CACHE_SIZE, settings.USER_CACHE_LOCAL_TTL, name='users_local'
+        )
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(user_id):
+        return f'user:{user_id}'
+
+    @staticmethod
+    def generation_key(user_id):
+        return f'generation:user:{user_id}'
+
+    @staticmethod
+    def cached_fields():
+        from .models import User
+
+        return [
+            field.attname for field in User._meta.concrete_fields if field.attname != 'password'
+        ]
+
+    def build(self, values):
+        """ Пользователь из сохранённых полей; пароль загрузится при обращении. """
+
+        from .models import User
+
+        names = self.cached_fields()
+
+        return User.from_db(values['db'], names, [values['fields'][name] for name in names])
+
+    def fetch(self, user_id):
+        from .models import User
+
+        queryset = User.objects.filter(pk=user_id)
+        fields = queryset.values(*self.cached_fields()).first()
+
+        if fields is None:
+            raise User.DoesNotExist('User matching query does not exist.')
+
+        return {'db': queryset.db, 'fields': fields}
+
+    def get(self, user_id):
+        """ Возвращает нового пользователя или вызывает User.DoesNotExist. """
+
+        from .models import User
+
+        if not settings.USER_CACHE_ENABLED:
+            return User.objects.get(pk=user_id)
+
+        values = self.local.get(self.key(user_id))
+
+        if values is None:
+            values = self.load(user_id)
+
+        return self.build(values)
+
+    async def aget(self, user_id):
+        """ Async-вариант get: попадание в локальный LRU обходится без потоков. """
+
+        if settings.USER_CACHE_ENABLED:
+            values = self.local.get(self.key(user_id))
+
+            if values is not None:
+                return self.build(values)
+
+        return await sync_to_async(self.get_uncached)(user_id)
+
+    def get_uncached(self, user_id):
+        from .models import User
+
+        if not settings.USER_CACHE_ENABLED:
+            return User.objects.get(pk=user_id)
+
+        return self.build(self.load(user_id))
+
+    def load(self, user_id):
+        """ Загружает поля пользователя из общего кэша или БД в локальный LRU. """
+
+        generation = get_generation(self.generation_key(user_id))
+        key = f'{self.key(user_id)}:{generation}'
+        values = cache.get(key) if settings.USER_CACHE_SHARED else None
+
+        if values is not None:
+            self.shared_hits += 1
+            cache_requests.inc(cache='users_shared', result='hit')
+        else:
+            self.misses += 1
+            cache_requests.inc(cache='users_shared', result='miss')
+            values = self.fetch(user_id)
+
+            if settings.USER_CACHE_SHARED:
+                cache.set(key, values, settings.USER_CACHE_TTL)
+
+        # Сброс во время загрузки: устаревшие поля не кладутся в LRU.
+        if get_generation(self.generation_key(user_id)) == generation:
+            self.local.set(self.key(user_id), values)
+
+        return values
+
+    def invalidate(self, user_id):
+        # Поколение меняется до удаления из LRU, см. проверку в load().
+        bump_generation(self.generation_key(user_id))
+        self.local.delete(self.key(user_id))
+
+    def stats(self):
+        return {
+            'local': self.local.stats(),
+            'shared': settings.USER_CACHE_SHARED,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+        }
+
+
+class ResponseCache:
+    """
+    Кэш сериализованных ответов по объектам в общем кэше Django: хранит
+    пару (ETag, данные), чтобы отвечать без запроса к БД и сериализатора.
+    """
+
+    def __init__(self, prefix, enabled, ttl):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, object_id):
+        return f'{self.prefix}:{object_id}'
+
+    def get(self, object_id):
+        if not self.enabled:
+            return None
+
+        item = cache.get(self.key(object_id))
+
+        if item is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        cache_requests.inc(cache=self.prefix, result='miss' if item is None else 'hit')
+
+        return item
+
+    def set(self, object_id, etag, data):
+        if self.enabled:
+            cache.set(self.key(object_id), (etag, data), self.ttl)
+
+    def invalidate(self, object_id):
+        cache.delete(self.key(object_id))
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class SearchCache:
+    """
+    Кэш страниц поиска в общем кэше Django. Ключ состоит из подписи
+    нормализованных параметров запроса и поколения модели. Любая запись
+    в модель увеличивает поколение, после чего старые страницы больше
+    не находятся и истекают по TTL.
+    """
+
+    def __init__(self, enabled, ttl):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def generation_key(name):
+        return f'generation:{name}'
+
+    def generation(self, name):
+        return get_generation(self.generation_key(name))
+
+    def bump(self, name):
+        bump_generation(self.generation_key(name))
+
+    @staticmethod
+    def signature(params):
+        data = json.dumps(params, sort_keys=True, default=str)
+
+        return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+    def get_or_set(self, name, params, compute):
+        """ Возвращает сохранённую страницу или вычисляет её через compute(). """
+
+        if not self.enabled:
+            return compute()
+
+        # Поколение читается до вычисления: если запись случится во время
+        # запроса, страница сохранится под старым поколением и не будет выдана.
+        key = f'search:{name}:{self.generation(name)}:{self.signature(params)}'
+        data = cache.get(key)
+
+        if data is not None:
+            self.hits += 1
+            cache_requests.inc(cache='search', result='hit')
+            return data
+
+        self.misses += 1
+        cache_requests.inc(cache='search', result='miss')
+        data = compute()
+        cache.set(key, data, self.ttl)
+
+        return data
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class TokenCache:
+    """
+    Кэш проверенных JWT: ключ - sha256 токена, значение - payload, который
+    живёт до exp токена. Повторный запрос с тем же токеном не проверяет
+    подпись заново. Время, потраченное на decode, учитывается, чтобы
+    оценить сэкономленное кэшем время.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(
+            settings.JWT_DECODE_CACHE_SIZE, settings.JWT_DECODE_CACHE_TTL, name='tokens'
+        )
+        self.decodes = 0
+        self.decode_time = 0.0
+
+    def decode(self, token):
+        if not settings.JWT_DECODE_CACHE_ENABLED:
+            return jwt.decode(token, settings.SECRET_KEY)
+
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        payload = self.local.get(key)
+
+        if payload is None:
+            started = time.perf_counter()
+            payload = jwt.decode(token, settings.SECRET_KEY)
+            self.decode_time += time.perf_counter() - started
+            self.decodes += 1
+
+            ttl = settings.JWT_DECODE_CACHE_TTL
+            if 'exp' in payload:
+                ttl = min(ttl, payload['exp'] - time.time())
+
+            if ttl > 0:
+                self.local.set(key, payload, ttl)
+        elif 'exp' in payload and payload['exp'] <= time.time():
+            # TTL записи считается по monotonic, а exp - по часам системы.
+            raise jwt.ExpiredSignatureError('Signature has expired')
+
+        return dict(payload)
+
+    def stats(self):
+        average = self.decode_time / self.decodes if self.decodes else 0.0
+
+        return {
+            'local': self.local.stats(),
+            'decodes': self.decodes,
+            'decode_seconds': self.decode_time,
+            'saved_seconds': self.local.hits * average,
+        }
+
+
+user_cache = UserCache()
+token_cache = TokenCache()
+passport_cache = ResponseCache(
+    'passport', settings.PASSPORT_CACHE_ENABLED, settings.PASSPORT_CACHE_TTL
+)
+search_cache = SearchCache(settings.SEARCH_CACHE_ENABLED, settings.SEARCH_CACHE_TTL)
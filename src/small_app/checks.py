@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_jwt_state_cache(app_configs, **kwargs):
+    """ Отзыв stateless JWT работает, только если состояния видят все воркеры. """
+
+    # Один процесс runserver: LocMem видят все запросы.
+    if not settings.JWT_STATELESS or settings.DEBUG:
+        return []
+
+    if settings.CACHES[settings.JWT_STATE_CACHE]['BACKEND'] == LOCMEM:
+        return [Warning(
+            'JWT_STATE_CACHE_BACKEND is LocMemCache: token revocation is not '
+            'shared between worker processes.',
+            hint='Use Redis (JWT_STATE_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache).',
+            id='small_app.W001',
+        )]
+
+    return []
@@ -0,0 +1,119 @@
+import gzip
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+BROTLI = 'br'
+GZIP = 'gzip'
+
+
+def choose_encoding(accept_encoding):
+    """ Лучшая кодировка из Accept-Encoding: br (если установлен brotli) или gzip. """
+
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in (BROTLI, GZIP):
+        if encoding == BROTLI and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+
+    return None
+
+
+def compress(encoding, content):
+    if encoding == BROTLI:
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(encoding, chunks):
+    if encoding == BROTLI:
+        compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(
+            settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+
+    yield finish()
+
+
+def is_excluded(request):
+    """ Ответ эндпоинта, который не сжимается (содержит токен). """
+
+    match = getattr(request, 'resolver_match', None)
+    return match is not None and match.url_name in settings.COMPRESSION_EXCLUDED_URL_NAMES
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжатие ответов gzip или brotli по Accept-Encoding клиента. Ответы меньше
+    COMPRESSION_MIN_SIZE байт не сжимаются, потоковые (экспорт) сжимаются
+    на лету. Как в GZipMiddleware, сильный ETag становится слабым.
+    Ответы эндпоинтов из COMPRESSION_EXCLUDED_URL_NAMES (регистрация, вход,
+    текущий пользователь - в них JWT) не сжимаются из-за BREACH.
+    """
+
+    def process_response(self, request, response):
+        if not settings.COMPRESSION_ENABLED or response.has_header('Content-Encoding'):
+            return response
+
+        if is_excluded(request):
+            return response
+
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(encoding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            content = compress(encoding, response.content)
+            if len(content) >= len(response.content):
+                return response
+
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+
+        return response
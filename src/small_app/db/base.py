@@ -0,0 +1,18 @@
+from django.db.backends.sqlite3 import base
+
+from small_app.sqlite import get_transaction_mode
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    sqlite3 с режимом начала транзакций из SQLITE_TRANSACTION_MODE.
+
+    Обычный BEGIN (DEFERRED) берёт блокировку записи только на первой
+    записи. Если в транзакции до неё было чтение, а другой процесс успел
+    закоммитить, sqlite в режиме WAL сразу отвечает 'database is locked',
+    не дожидаясь busy_timeout. BEGIN IMMEDIATE берёт блокировку в начале
+    транзакции и ждёт её по busy_timeout.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {get_transaction_mode()}')
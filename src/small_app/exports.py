@@ -0,0 +1,44 @@
+import csv
+
+from .renders import dumps
+
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+EXPORT_FORMATS = (NDJSON, CSV)
+
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv; charset=utf-8',
+}
+
+PASSPORT_EXPORT_FIELDS = (
+    'id', 'passport_series', 'passport_number', 'first_name', 'last_name',
+)
+
+
+class Echo:
+    """ Псевдо-буфер для csv.writer: возвращает записанную строку. """
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(fields, rows):
+    for row in rows:
+        yield dumps(dict(zip(fields, row))) + b'\n'
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_lines(export_format, fields, rows):
+    if export_format == CSV:
+        return csv_lines(fields, rows)
+
+    return ndjson_lines(fields, rows)
@@ -0,0 +1,159 @@
+"""
+Сериализация списков только для чтения в обход DRF. Поля сериализатора
+разбираются один раз при создании, строки берутся из values_list() и
+собираются в dict без экземпляров модели и без to_representation на каждое
+поле. Результат совпадает с data исходного сериализатора.
+"""
+import copy
+
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+from .serializers import PassportsSerializer, PassportSearchSerializer, UsersSerializer
+
+
+# Раскладка списков в ответе: список объектов или имена полей один раз
+# и массивы значений.
+LAYOUT_OBJECTS = 'objects'
+LAYOUT_COLUMNAR = 'columnar'
+LAYOUTS = (LAYOUT_OBJECTS, LAYOUT_COLUMNAR)
+
+# Значения этих полей из БД уже имеют тип представления.
+DIRECT_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+
+class RowSerializer:
+    """
+    Строки values_list(*sources) в dict с полями сериализатора serializer.
+    names ограничивает набор полей (sparse fieldset), порядок полей
+    остаётся как в сериализаторе.
+    """
+
+    def __init__(self, serializer, names=None):
+        self.serializer = serializer
+        self.names = []
+        self.sources = []
+        self.converters = []
+        self.selections = {}
+
+        readable = [
+            (name, field) for name, field in serializer.fields.items() if not field.write_only
+        ]
+        self.declared = tuple(name for name, _ in readable)
+
+        for position, (name, field) in enumerate(
+            (name, field) for name, field in readable if names is None or name in names
+        ):
+            if (
+                field.source == '*'
+                or isinstance(field, (RelatedField, serializers.BaseSerializer))
+                or isinstance(field, serializers.SerializerMethodField)
+            ):
+                raise ImproperlyConfigured(
+                    f'{type(serializer).__name__}.{name} cannot be read from values_list()'
+                )
+
+            self.names.append(name)
+            self.sources.append(field.source.replace('.', '__'))
+
+            if not isinstance(field, DIRECT_FIELDS):
+                self.converters.append((position, field.to_representation))
+
+        self.names = tuple(self.names)
+        self.sources = tuple(self.sources)
+
+    def select(self, names):
+        """ RowSerializer только с полями names, создаётся один раз на набор. """
+
+        names = frozenset(names)
+        if names not in self.selections:
+            self.selections[names] = RowSerializer(self.serializer, names)
+
+        return self.selections[names]
+
+    def convert(self, rows):
+        """ Списки значений в порядке names. """
+
+        if not self.converters:
+            return [list(row) for row in rows]
+
+        data = []
+        for row in rows:
+            row = list(row)
+            for position, convert in self.converters:
+                if row[position] is not None:
+                    row[position] = convert(row[position])
+            data.append(row)
+
+        return data
+
+    def to_representation(self, rows):
+        names = self.names
+
+        if not self.converters:
+            return [dict(zip(names, row)) for row in rows]
+
+        return [dict(zip(names, row)) for row in self.convert(rows)]
+
+    def to_columnar(self, rows):
+        return {'fields': list(self.names), 'rows': self.convert(rows)}
+
+
+class PageSerializer:
+    """
+    Обёртка страницы (как PassportsSerializer): вложенные списки идут через
+    RowSerializer, остальные поля - через свои to_representation, их немного.
+    """
+
+    def __init__(self, serializer_class):
+        self.fields = []
+        self.rows = {}
+
+        for name, field in serializer_class().fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                self.rows[name] = RowSerializer(field.child)
+
+            self.fields.append((name, field))
+
+    def select(self, name, names):
+        """ Копия, в которой вложенный список name содержит только поля names. """
+
+        if names is None:
+            return self
+
+        page = copy.copy(self)
+        page.rows = {**self.rows, name: self.rows[name].select(names)}
+
+        return page
+
+    def declared(self, name):
+        """ Все поля вложенного списка name, доступные для fields=. """
+
+        return self.rows[name].declared
+
+    def sources(self, name):
+        """ Поля для values_list() вложенного списка name. """
+
+        return self.rows[name].sources
+
+    def to_representation(self, page, layout=LAYOUT_OBJECTS):
+        data = {}
+
+        for name, field in self.fields:
+            value = page[name]
+
+            if name in self.rows and layout == LAYOUT_COLUMNAR:
+                data[name] = self.rows[name].to_columnar(value)
+            elif name in self.rows:
+                data[name] = self.rows[name].to_representation(value)
+            else:
+                data[name] = None if value is None else field.to_representation(value)
+
+        return data
+
+
+passports_page = PageSerializer(PassportsSerializer)
+passports_search_page = PageSerializer(PassportSearchSerializer)
+users_page = PageSerializer(UsersSerializer)
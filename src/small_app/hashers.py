@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """ PBKDF2 с числом итераций из PASSWORD_PBKDF2_ITERATIONS. """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """ Argon2 с параметрами из PASSWORD_ARGON2_*. Требует argon2-cffi. """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class TunedBCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """ bcrypt с числом раундов из PASSWORD_BCRYPT_ROUNDS. Требует bcrypt. """
+
+    @property
+    def rounds(self):
+        return settings.PASSWORD_BCRYPT_ROUNDS
+
+
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """ scrypt с параметрами из PASSWORD_SCRYPT_*. """
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # hashlib.scrypt требует 128 * n * r * p байт с запасом.
+        return 256 * self.work_factor * self.block_size * self.parallelism
+
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+from rest_framework import exceptions, status
+
+
+class HashingPoolSaturated(exceptions.APIException):
+    """ Пул хэширования занят: 503 с заголовком Retry-After. """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many login attempts are being processed, try again later.'
+    default_code = 'service_unavailable'
+
+    def __init__(self, wait=None):
+        super().__init__()
+        self.wait = settings.PASSWORD_HASH_RETRY_AFTER if wait is None else wait
+
+
+def verify_password(raw_password, encoded):
+    """
+    Проверяет пароль, не трогая БД. Возвращает (совпал ли пароль, нужно ли
+    перехэшировать). Для несуществующего пользователя всё равно считает
+    хэш, чтобы время ответа не выдавало наличие логина.
+    """
+    if encoded is None:
+        make_password(raw_password)
+        return False, False
+
+    must_update = []
+    valid = check_password(raw_password, encoded, setter=must_update.append)
+
+    return valid, bool(must_update)
+
+
+class HashingPool:
+    """
+    Ограниченный пул потоков для хэширования паролей. Одновременно
+    выполняется не больше PASSWORD_HASH_WORKERS хэшей, в очереди ждут не
+    больше PASSWORD_HASH_QUEUE_SIZE запросов и не дольше
+    PASSWORD_HASH_QUEUE_TIMEOUT секунд, остальные сразу получают 503.
+    PBKDF2, scrypt, bcrypt и argon2 отпускают GIL, поэтому потоков достаточно.
+    """
+
+    def __init__(self, workers=None, queue_size=None, queue_timeout=None):
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.queue_size = settings.PASSWORD_HASH_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = (
+            settings.PASSWORD_HASH_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='password-hash'
+        )
+        self.slots = threading.BoundedSemaphore(self.workers)
+        self.waiting = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            return
+
+        with self._lock:
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise HashingPoolSaturated()
+            self.waiting += 1
+
+        try:
+            acquired = self.slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolSaturated()
+
+    def submit(self, fn, *args):
+        self.acquire()
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self.slots.release())
+
+        return future
+
+    def run(self, fn, *args):
+        """ Выполняет fn в пуле и ждёт результат в текущем потоке. """
+
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        """ Асинхронный вариант run: цикл событий не блокируется. """
+
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, fn, *args)
+
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+        }
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,186 @@
+import csv
+import json
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from rest_framework import serializers
+
+from .caches import search_cache
+from .models import Passport
+from .serializers import PassportCreateSerializer
+from .sqlite import write_queue
+
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+IMPORT_FORMATS = (NDJSON, CSV)
+
+CONTENT_TYPES = {
+    'application/x-ndjson': NDJSON,
+    'application/jsonlines': NDJSON,
+    'text/csv': CSV,
+}
+
+
+# Строка не в UTF-8: попадает в отчёт об ошибках, а не прерывает импорт.
+INVALID_ENCODING = object()
+
+
+def decode_lines(lines, invalid):
+    """ Декодирует строки по одной, номера строк не в UTF-8 добавляются в invalid. """
+
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                invalid.add(number)
+                line = line.decode('utf-8', errors='replace')
+
+        yield line
+
+
+def read_ndjson(lines):
+    """ Построчно разбирает NDJSON, возвращает пары (номер строки, данные). """
+
+    invalid = set()
+
+    for number, line in enumerate(decode_lines(lines, invalid), start=1):
+        if number in invalid:
+            yield number, INVALID_ENCODING
+            continue
+
+        if not line.strip():
+            continue
+
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def read_csv(lines):
+    """ Разбирает CSV с заголовком, возвращает пары (номер строки, данные). """
+
+    invalid = set()
+    reader = csv.DictReader(decode_lines(lines, invalid))
+    last_line = 1
+
+    for row in reader:
+        # Запись в кавычках может занимать несколько строк файла.
+        lines_read = range(last_line + 1, reader.line_num + 1)
+        last_line = reader.line_num
+
+        if invalid.intersection(lines_read):
+            yield reader.line_num, INVALID_ENCODING
+        else:
+            yield reader.line_num, row
+
+
+class PassportImporter:
+    """
+    Потоковый импорт паспортов. Строки проверяются теми же правилами,
+    что и в PassportCreateSerializer, дубликаты отсеиваются одним запросом
+    на пачку, запись идёт через bulk_create. Ошибки в отдельных строках
+    не прерывают загрузку, а попадают в отчёт.
+    """
+
+    def __init__(self, batch_size=None, max_errors=None):
+        self.batch_size = batch_size or settings.PASSPORTS_IMPORT_BATCH_SIZE
+        self.max_errors = max_errors or settings.PASSPORTS_IMPORT_MAX_ERRORS
+        self.serializer = PassportCreateSerializer()
+
+        self.created = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+
+            created = self.created
+            self.import_chunk(chunk)
+
+            # bulk_create не отправляет post_save, поколение меняем сами.
+            if self.created != created:
+                search_cache.bump('passport')
+
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'errors': self.errors
+        }
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def validate(self, chunk):
+        valid = {}
+        for row_number, data in chunk:
+            if data is INVALID_ENCODING:
+                self.add_error(row_number, {'error': ['Invalid UTF-8']})
+                continue
+
+            if not isinstance(data, dict):
+                self.add_error(row_number, {'error': ['Invalid row']})
+                continue
+
+            try:
+                validated_data = self.serializer.run_validation(data)
+            except serializers.ValidationError as e:
+                self.add_error(row_number, e.detail)
+                continue
+
+            key = (validated_data['passport_series'], validated_data['passport_number'])
+            if key in valid:
+                self.duplicates += 1
+                continue
+
+            valid[key] = (row_number, validated_data)
+
+        return valid
+
+    def import_chunk(self, chunk):
+        valid = self.validate(chunk)
+        if not valid:
+            return
+
+        existing = Passport.objects.filter(
+            passport_series__in={series for series, _ in valid},
+            passport_number__in={number for _, number in valid},
+        ).values_list('passport_series', 'passport_number')
+
+        for key in existing:
+            if valid.pop(key, None) is not None:
+                self.duplicates += 1
+
+        passports = [Passport(**validated_data) for _, validated_data in valid.values()]
+
+        try:
+            write_queue.run(Passport.objects.bulk_create, passports, batch_size=self.batch_size)
+            self.created += len(passports)
+        except IntegrityError:
+            # Кто-то успел вставить те же данные параллельно - пишем по одной.
+            self.insert_one_by_one(valid.values())
+
+    def insert_one_by_one(self, rows):
+        for _, validated_data in rows:
+            try:
+                write_queue.run(Passport.objects.create, **validated_data)
+                self.created += 1
+            except IntegrityError:
+                self.duplicates += 1
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from small_app.benchmarks import run_load
+from small_app.models import User, Passport
+
+
+SCENARIOS = (
+    ('passport_detail', '/api/passports/{passport_id}', '/api/async/passports/{passport_id}'),
+    ('passport_search', '/api/passports?last_name=иванов&page_size=20',
+     '/api/async/passports?last_name=иванов&page_size=20'),
+    ('current_user', '/api/users/current', '/api/async/users/current'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность и p99 синхронных DRF-представлений '
+        'и их async-вариантов под ASGI-обработчиком на тестовой БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Число запросов на каждый сценарий и вариант')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--passports', type=int, default=1000,
+                            help='Сколько паспортов создать в тестовой БД')
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, variants in results.items():
+            for variant, summary in variants.items():
+                self.stdout.write(
+                    f"{name:<16} {variant:<6} "
+                    f"{summary['throughput_rps']:>8} rps  "
+                    f"p50 {summary['latency_ms']['p50']:>8} ms  "
+                    f"p99 {summary['latency_ms']['p99']:>8} ms  "
+                    f"errors {summary['errors']}"
+                )
+
+    def run(self, options):
+        user = User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark-password')
+        Passport.objects.bulk_create([
+            Passport(
+                first_name='Иван',
+                last_name='Иванов' if number % 2 else 'Петров',
+                passport_series=1000 + number // 900000,
+                passport_number=100000 + number % 900000
+            )
+            for number in range(options['passports'])
+        ])
+        passport_id = Passport.objects.values_list('id', flat=True).first()
+        token = user.token
+
+        return asyncio.run(self.run_scenarios(
+            token, passport_id, options['requests'], options['concurrency']
+        ))
+
+    @staticmethod
+    async def run_scenarios(token, passport_id, total, concurrency):
+        client = AsyncClient()
+        results = {}
+
+        for name, sync_path, async_path in SCENARIOS:
+            results[name] = {}
+
+            for variant, path in (('sync', sync_path), ('async', async_path)):
+                path = path.format(passport_id=passport_id)
+
+                async def send():
+                    response = await client.get(path, authorization=f'Bearer {token}')
+                    return response.status_code == 200
+
+                # Прогрев кэшей и соединения.
+                await send()
+                results[name][variant] = await run_load(send, total, concurrency)
+
+        return results
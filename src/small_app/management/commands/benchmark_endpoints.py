@@ -0,0 +1,277 @@
+import json
+import secrets
+import shutil
+
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from small_app.benchmarks import (
+    SERVER_MODES, compare_reports, git_revision, launch_server, request_json,
+    run_http_load, server_command
+)
+from small_app.management.commands.seed_data import (
+    FIRST_NAMES, LAST_NAMES, admin_username, seed_username
+)
+
+
+ENDPOINTS = (
+    'register', 'login', 'current_user', 'users_search', 'passport_list',
+    'passport_search', 'passport_detail', 'passport_patch', 'passport_delete',
+)
+
+
+def json_request(method, path, data=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token is not None:
+        headers['Authorization'] = f'Bearer {token}'
+
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+
+    return method, path, body, headers
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон по эндпоинтам API: регистрация, вход, текущий '
+        'пользователь, поиск пользователей и паспортов, получение, изменение '
+        'и удаление паспорта. Нужна БД, наполненная seed_data с теми же '
+        '--prefix и --password. Отчёт в JSON: rps и p50/p95/p99 на эндпоинт; '
+        'с --baseline сравнивается с прошлым отчётом и падает при регрессии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Уже запущенный сервер; по умолчанию сервер запускается сам'
+        )
+        parser.add_argument('--server', choices=SERVER_MODES, default='runserver')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--gunicorn-config',
+            default=str(settings.BASE_DIR.parent / 'deploy' / 'gunicorn.conf.py')
+        )
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на эндпоинт')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--users', type=int, default=1000, help='Сколько пользователей создал seed_data')
+        parser.add_argument('--output', default=None, help='Файл для JSON-отчёта')
+        parser.add_argument('--baseline', default=None, help='Отчёт прошлой ревизии')
+        parser.add_argument('--max-regression', type=float, default=20.0, help='Допуск, %%')
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline: {e}')
+
+        if options['base_url']:
+            endpoints = self.run_endpoints(options['base_url'], options)
+        else:
+            if options['server'] != 'runserver' and shutil.which('gunicorn') is None:
+                raise CommandError('gunicorn is not installed')
+
+            bind = f'127.0.0.1:{options["port"]}'
+            command, env = server_command(options['server'], bind, options['gunicorn_config'])
+
+            try:
+                with launch_server(command, f'http://{bind}', env=env, cwd=settings.BASE_DIR):
+                    endpoints = self.run_endpoints(f'http://{bind}', options)
+            except RuntimeError as e:
+                raise CommandError(e)
+
+        report = {
+            'revision': git_revision(settings.BASE_DIR),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'server': options['base_url'] or options['server'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'endpoints': endpoints,
+        }
+
+        if baseline is not None:
+            report['baseline_revision'] = baseline.get('revision')
+            report['comparison'] = compare_reports(baseline, report, options['max_regression'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        regressions = [
+            name for name, change in report.get('comparison', {}).items() if change['regression']
+        ]
+        if regressions:
+            raise CommandError(f'Regression over {options["max_regression"]}%: {", ".join(regressions)}')
+
+    def print_report(self, report):
+        comparison = report.get('comparison', {})
+
+        for name, summary in report['endpoints'].items():
+            if 'error' in summary:
+                self.stdout.write(f'{name:<16} {summary["error"]}')
+                continue
+
+            line = (
+                f"{name:<16} {summary['throughput_rps']:>8} rps  "
+                f"p50 {summary['latency_ms']['p50']:>8} ms  "
+                f"p95 {summary['latency_ms']['p95']:>8} ms  "
+                f"p99 {summary['latency_ms']['p99']:>8} ms  "
+                f"errors {summary['errors']}"
+            )
+
+            if name in comparison:
+                p95 = comparison[name]['p95_change_percent']
+                # None, если в прошлом отчёте p95 нулевой или отсутствует.
+                line += '  p95 n/a' if p95 is None else f'  p95 {p95:+}%'
+
+            self.stdout.write(line)
+
+    def run_endpoints(self, base_url, options):
+        prefix, password = options['prefix'], options['password']
+
+        def login(username):
+            status, body = request_json(base_url, 'POST', '/api/login', {
+                'username': username,
+                'password': password,
+            })
+            if status != 200:
+                raise CommandError(
+                    f'Login as {username} failed with status {status}, run seed_data first'
+                )
+            return body['token']
+
+        admin_token = login(admin_username(prefix))
+        tokens = [
+            login(seed_username(prefix, number))
+            for number in range(min(options['concurrency'], options['users']))
+        ]
+
+        # Половина паспортов читается и меняется, вторая удаляется.
+        ids = self.passport_ids(base_url, admin_token, 2 * options['requests'])
+        if len(ids) < 2:
+            raise CommandError('Not enough passports, run seed_data first')
+
+        read_ids, delete_ids = ids[:len(ids) // 2], ids[len(ids) // 2:]
+        run = secrets.token_hex(4)
+
+        def token(number):
+            return tokens[number % len(tokens)]
+
+        scenarios = {
+            'register': (
+                lambda number: json_request('POST', '/api/users', {
+                    'username': f'load_{run}_{number}',
+                    'email': f'load_{run}_{number}@example.com',
+                    'password': password,
+                }),
+                (201,)
+            ),
+            'login': (
+                lambda number: json_request('POST', '/api/login', {
+                    'username': seed_username(prefix, number % options['users']),
+                    'password': password,
+                }),
+                (200,)
+            ),
+            'current_user': (
+                lambda number: json_request('GET', '/api/users/current', token=token(number)),
+                (200,)
+            ),
+            'users_search': (
+                lambda number: json_request(
+                    'GET',
+                    f'/api/users_search?username={seed_username(prefix, number % options["users"])}',
+                    token=admin_token
+                ),
+                (200,)
+            ),
+            'passport_list': (
+                lambda number: json_request(
+                    'GET',
+                    f'/api/passports?last_name={quote(LAST_NAMES[number % len(LAST_NAMES)])}',
+                    token=token(number)
+                ),
+                (200,)
+            ),
+            'passport_search': (
+                lambda number: json_request(
+                    'GET',
+                    f'/api/passports/search?q={quote(FIRST_NAMES[number % len(FIRST_NAMES)][:3])}',
+                    token=token(number)
+                ),
+                (200,)
+            ),
+            'passport_detail': (
+                lambda number: json_request(
+                    'GET', f'/api/passports/{read_ids[number % len(read_ids)]}', token=token(number)
+                ),
+                (200,)
+            ),
+            'passport_patch': (
+                lambda number: json_request(
+                    'PATCH',
+                    f'/api/passports/{read_ids[number % len(read_ids)]}',
+                    {'first_name': FIRST_NAMES[number % len(FIRST_NAMES)]},
+                    token=token(number)
+                ),
+                (200,)
+            ),
+            'passport_delete': (
+                lambda number: json_request(
+                    'DELETE', f'/api/passports/{delete_ids[number]}', token=token(number)
+                ),
+                (200,)
+            ),
+        }
+
+        results = {}
+        for name in options['endpoints']:
+            make_request, ok_statuses = scenarios[name]
+            total = options['requests']
+
+            # Каждый паспорт удаляется один раз.
+            if name == 'passport_delete':
+                total = min(total, len(delete_ids))
+
+            results[name] = run_http_load(
+                base_url, make_request, total, options['concurrency'], ok_statuses
+            )
+
+        return results
+
+    @staticmethod
+    def passport_ids(base_url, token, limit):
+        """ id паспортов постранично через cursor, только поле id. """
+
+        ids, cursor = [], None
+        headers = {'Authorization': f'Bearer {token}'}
+
+        while len(ids) < limit:
+            path = f'/api/passports?fields=id&page_size={settings.PASSPORTS_MAX_PAGE_SIZE}'
+            if cursor:
+                path += f'&cursor={quote(cursor)}'
+
+            status, body = request_json(base_url, 'GET', path, headers=headers)
+            if status != 200:
+                raise CommandError(f'Passport list failed with status {status}')
+
+            ids.extend(passport['id'] for passport in body['passports'])
+            cursor = body.get('next')
+
+            if not cursor:
+                break
+
+        return ids[:limit]
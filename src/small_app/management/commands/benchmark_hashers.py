@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+PASSWORD = 'benchmark-password'
+
+
+def measure(path, duration):
+    """ Число хэшей в секунду на одном ядре для хэшера path. """
+
+    hasher = import_string(path)()
+    salt = hasher.salt()
+
+    hashes = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        hasher.encode(PASSWORD, salt)
+        hashes += 1
+
+    return hashes / (time.perf_counter() - started)
+
+
+def measure_in_process(path, duration):
+    import django
+
+    django.setup()
+
+    return measure(path, duration)
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет число хэшей паролей в секунду на ядро для каждого '
+        'хэшера из PASSWORD_HASHERS с текущими параметрами'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=2.0,
+                            help='Время замера одного хэшера, секунд')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Число параллельных процессов для замера под нагрузкой')
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        duration = options['duration']
+        processes = max(1, min(options['processes'], os.cpu_count() or 1))
+
+        results = []
+        for hasher in get_hashers():
+            path = f'{type(hasher).__module__}.{type(hasher).__qualname__}'
+
+            try:
+                hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as e:
+                # Не установлена библиотека argon2-cffi или bcrypt.
+                results.append({'hasher': path, 'algorithm': hasher.algorithm, 'error': str(e)})
+                continue
+
+            if processes == 1:
+                rates = [measure(path, duration)]
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    rates = list(executor.map(
+                        measure_in_process, [path] * processes, [duration] * processes
+                    ))
+
+            summary = hasher.safe_summary(hasher.encode(PASSWORD, hasher.salt()))
+
+            results.append({
+                'hasher': path,
+                'algorithm': hasher.algorithm,
+                'params': {
+                    key: value for key, value in summary.items()
+                    if key not in ('algorithm', 'salt', 'hash', 'checksum')
+                },
+                'processes': processes,
+                'hashes_per_second_per_core': sum(rates) / len(rates),
+                'hashes_per_second_total': sum(rates),
+                'ms_per_hash': 1000 * len(rates) / sum(rates),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, default=str))
+            return
+
+        for result in results:
+            if 'error' in result:
+                self.stdout.write(f"{result['algorithm']:<16} {result['error']}")
+                continue
+
+            self.stdout.write(
+                f"{result['algorithm']:<16} "
+                f"{result['hashes_per_second_per_core']:>10.1f} hashes/s per core  "
+                f"{result['ms_per_hash']:>8.1f} ms/hash  "
+                f"{result['hashes_per_second_total']:>10.1f} hashes/s on {result['processes']} processes"
+            )
@@ -0,0 +1,89 @@
+import json
+import time
+
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+
+from small_app.benchmarks import summarize
+from small_app.models import Passport
+from small_app.renders import orjson, orjson_dumps, stdlib_dumps
+from small_app.serializers import PassportsSerializer
+
+
+def build_payload(size):
+    """ Страница PassportsSerializer из size паспортов без обращения к БД. """
+
+    created_at = datetime.now(timezone.utc)
+    passports = [
+        Passport(
+            id=number,
+            passport_series=1000 + number % 9000,
+            passport_number=100000 + number % 900000,
+            first_name=f'Иван{number}',
+            last_name=f'Иванов{number}',
+            created_at=created_at,
+        )
+        for number in range(1, size + 1)
+    ]
+
+    return PassportsSerializer({
+        'passports': passports,
+        'amount': size,
+        'amount_mode': 'exact',
+        'next': None,
+        'previous': None,
+    }).data
+
+
+class Command(BaseCommand):
+    help = (
+        'Микро-бенчмарк рендеринга JSON: прежний json.dumps из UserJSONRenderer, '
+        'JSONRenderer DRF и FastJSONRenderer с бэкендами json и orjson'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--passports', type=int, default=10000,
+                            help='Число паспортов в ответе')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        data = build_payload(options['passports'])
+
+        renderers = {
+            # Прежний UserJSONRenderer: str, который Response кодирует ещё раз.
+            'json.dumps': lambda payload: json.dumps(payload).encode('utf-8'),
+            'drf': JSONRenderer().render,
+            'fast-json': stdlib_dumps,
+        }
+        if orjson is not None:
+            renderers['fast-orjson'] = orjson_dumps
+
+        results = {}
+        for name, render in renderers.items():
+            latencies = []
+            started = time.perf_counter()
+
+            for _ in range(options['repeat']):
+                render_started = time.perf_counter()
+                content = render(data)
+                latencies.append(time.perf_counter() - render_started)
+
+            results[name] = {
+                **summarize(latencies, time.perf_counter() - started),
+                'bytes': len(content),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, summary in results.items():
+            self.stdout.write(
+                f"{name:<12} p50 {summary['latency_ms']['p50']:>9} ms  "
+                f"p99 {summary['latency_ms']['p99']:>9} ms  "
+                f"{summary['bytes']:>9} bytes"
+            )
@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from small_app.benchmarks import summarize
+from small_app.fast_serializers import passports_page
+from small_app.models import Passport
+from small_app.serializers import PassportSerializer
+
+
+def build_rows(size):
+    """ Одни и те же паспорта в виде экземпляров модели и кортежей values_list. """
+
+    sources = passports_page.sources('passports')
+    passports = [
+        Passport(
+            id=number,
+            passport_series=1000 + number % 9000,
+            passport_number=100000 + number % 900000,
+            first_name=f'Иван{number}',
+            last_name=f'Иванов{number}',
+        )
+        for number in range(1, size + 1)
+    ]
+    rows = [tuple(getattr(passport, source) for source in sources) for passport in passports]
+
+    return passports, rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию списка паспортов через PassportSerializer(many=True) '
+        'и через RowSerializer по кортежам values_list, время на строку в мкс'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        passports, rows = build_rows(options['rows'])
+        row_serializer = passports_page.rows['passports']
+
+        if row_serializer.to_representation(rows) != PassportSerializer(passports, many=True).data:
+            raise AssertionError('RowSerializer output differs from PassportSerializer')
+
+        variants = {
+            'drf': lambda: PassportSerializer(passports, many=True).data,
+            'rows': lambda: row_serializer.to_representation(rows),
+        }
+
+        results = {}
+        for name, serialize in variants.items():
+            latencies = []
+            started = time.perf_counter()
+
+            for _ in range(options['repeat']):
+                serialize_started = time.perf_counter()
+                serialize()
+                latencies.append(time.perf_counter() - serialize_started)
+
+            summary = summarize(latencies, time.perf_counter() - started)
+            summary['us_per_row'] = round(
+                1000 * summary['latency_ms']['p50'] / options['rows'], 3
+            )
+            results[name] = summary
+
+        results['speedup'] = round(
+            results['drf']['us_per_row'] / results['rows']['us_per_row'], 1
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name in variants:
+            self.stdout.write(f"{name:<6} {results[name]['us_per_row']:>8} us/row")
+        self.stdout.write(f"speedup x{results['speedup']}")
@@ -0,0 +1,91 @@
+import json
+import secrets
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from small_app.benchmarks import (
+    SERVER_MODES, launch_server, request_json, run_http_load, server_command
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Смоук-бенчмарк режимов запуска: runserver против gunicorn (WSGI) и '
+        'gunicorn + uvicorn (ASGI) в production-профиле. Регистрирует в '
+        'текущей БД пользователя bench_* и нагружает GET /api/users/current.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=SERVER_MODES, default=list(SERVER_MODES))
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--gunicorn-config',
+            default=str(settings.BASE_DIR.parent / 'deploy' / 'gunicorn.conf.py')
+        )
+        parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    def handle(self, *args, **options):
+        base_url = f'http://127.0.0.1:{options["port"]}'
+        bind = f'127.0.0.1:{options["port"]}'
+
+        results = {}
+        for mode in options['modes']:
+            command, env = server_command(mode, bind, options['gunicorn_config'])
+
+            if mode != 'runserver' and shutil.which('gunicorn') is None:
+                results[mode] = {'error': 'gunicorn is not installed'}
+                continue
+
+            try:
+                with launch_server(command, base_url, env=env, cwd=settings.BASE_DIR):
+                    results[mode] = self.measure(base_url, options)
+            except RuntimeError as e:
+                results[mode] = {'error': str(e)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for mode, summary in results.items():
+            if 'error' in summary:
+                self.stdout.write(f'{mode:<10} {summary["error"]}')
+                continue
+
+            self.stdout.write(
+                f"{mode:<10} {summary['throughput_rps']:>8} rps  "
+                f"p50 {summary['latency_ms']['p50']:>8} ms  "
+                f"p99 {summary['latency_ms']['p99']:>8} ms  "
+                f"errors {summary['errors']}"
+            )
+
+    @staticmethod
+    def measure(base_url, options):
+        credentials = {
+            'username': f'bench_{secrets.token_hex(6)}',
+            'email': f'bench_{secrets.token_hex(6)}@example.com',
+            'password': secrets.token_urlsafe(12),
+        }
+
+        status, _ = request_json(base_url, 'POST', '/api/users', credentials)
+        if status != 201:
+            raise CommandError(f'Registration failed with status {status}')
+
+        status, body = request_json(base_url, 'POST', '/api/login', {
+            'username': credentials['username'],
+            'password': credentials['password'],
+        })
+        if status != 200:
+            raise CommandError(f'Login failed with status {status}')
+
+        headers = {'Authorization': f'Bearer {body["token"]}'}
+
+        return run_http_load(
+            base_url,
+            lambda _: ('GET', '/api/users/current', None, headers),
+            options['requests'],
+            options['concurrency']
+        )
@@ -0,0 +1,40 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from small_app.imports import (
+    NDJSON, CSV, IMPORT_FORMATS, PassportImporter, read_ndjson, read_csv
+)
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт паспортов из NDJSON или CSV файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу, "-" - stdin')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format']
+
+        if import_format is None:
+            import_format = CSV if path.endswith('.csv') else NDJSON
+
+        reader = read_csv if import_format == CSV else read_ndjson
+        importer = PassportImporter(batch_size=options['batch_size'])
+
+        # Байты, а не текст: строки декодируются по одной в reader, и
+        # строка не в UTF-8 становится ошибкой строки, а не прерывает импорт.
+        try:
+            if path == '-':
+                summary = importer.run(reader(sys.stdin.buffer))
+            else:
+                with open(path, 'rb') as stream:
+                    summary = importer.run(reader(stream))
+        except OSError as e:
+            raise CommandError(e)
+
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
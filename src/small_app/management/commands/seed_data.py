@@ -0,0 +1,133 @@
+import json
+import random
+import time
+
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from small_app.caches import search_cache
+from small_app.models import User, Passport
+from small_app.sqlite import write_queue
+
+
+FIRST_NAMES = (
+    'Иван', 'Пётр', 'Сергей', 'Алексей', 'Дмитрий', 'Андрей', 'Михаил', 'Николай',
+    'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина', 'Светлана',
+)
+LAST_NAMES = (
+    'Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев',
+    'Козлов', 'Новиков', 'Морозов', 'Волков', 'Фёдоров', 'Михайлов', 'Беляев', 'Орлов',
+)
+
+# Серия 1000-9999 и номер 100000-999999, как в PassportCreateSerializer.
+PASSPORT_NUMBERS = 900000
+PASSPORT_KEYS = 9000 * PASSPORT_NUMBERS
+
+
+def seed_username(prefix, number):
+    return f'{prefix}_{number}'
+
+
+def admin_username(prefix):
+    return f'{prefix}_admin'
+
+
+def passport_key(key):
+    """ Порядковый номер в (серия, номер) без повторов. """
+
+    return 1000 + key // PASSPORT_NUMBERS, 100000 + key % PASSPORT_NUMBERS
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстрое наполнение БД для нагрузочных тестов: N пользователей '
+        '<prefix>_<i> и staff-пользователь <prefix>_admin с одним паролем, '
+        'M паспортов со случайными (но воспроизводимыми по --seed) данными. '
+        'Строки заведомо корректны, поэтому пишутся bulk_create без '
+        'валидации; пароль хэшируется один раз. Повторный запуск '
+        'пропускает уже существующие записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--passports', type=int, default=10000)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=settings.PASSPORTS_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        users = self.seed_users(options)
+        passports = self.seed_passports(options)
+
+        # bulk_create не отправляет post_save, поколения поиска меняем сами.
+        search_cache.bump('user')
+        search_cache.bump('passport')
+
+        self.stdout.write(json.dumps({
+            'users': users,
+            'passports': passports,
+            'admin': admin_username(options['prefix']),
+            'seconds': round(time.perf_counter() - started, 3),
+        }, ensure_ascii=False, indent=2))
+
+    @staticmethod
+    def bulk_create(model, objects, batch_size):
+        before = model.objects.count()
+
+        for chunk in chunks(objects, batch_size):
+            write_queue.run(model.objects.bulk_create, chunk, ignore_conflicts=True)
+
+        return model.objects.count() - before
+
+    def seed_users(self, options):
+        prefix = options['prefix']
+        password = make_password(options['password'])
+
+        admin = User(
+            username=admin_username(prefix),
+            email=f'{admin_username(prefix)}@example.com',
+            password=password,
+            is_staff=True,
+            is_superuser=True
+        )
+        users = (
+            User(
+                username=seed_username(prefix, number),
+                email=f'{seed_username(prefix, number)}@example.com',
+                password=password
+            )
+            for number in range(options['users'])
+        )
+
+        return self.bulk_create(User, [admin, *users], options['batch_size'])
+
+    def seed_passports(self, options):
+        generator = random.Random(options['seed'])
+        keys = generator.sample(range(PASSPORT_KEYS), options['passports'])
+
+        passports = (
+            Passport(
+                first_name=generator.choice(FIRST_NAMES),
+                last_name=generator.choice(LAST_NAMES),
+                passport_series=series,
+                passport_number=number
+            )
+            for series, number in map(passport_key, keys)
+        )
+
+        return self.bulk_create(Passport, passports, options['batch_size'])
@@ -1,2 +1,3 @@
+from .amount import AMOUNT_EXACT, AMOUNT_ESTIMATED, AMOUNT_NONE, AMOUNT_MODES
 from .user import UserManager
-from .passport import PassportManager
\ No newline at end of file
+from .passport import PassportManager
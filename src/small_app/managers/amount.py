@@ -0,0 +1,61 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+AMOUNT_EXACT = 'exact'
+AMOUNT_ESTIMATED = 'estimated'
+AMOUNT_NONE = 'none'
+AMOUNT_MODES = (AMOUNT_EXACT, AMOUNT_ESTIMATED, AMOUNT_NONE)
+
+
+class AmountMixin:
+    """
+    Подсчёт количества найденных записей в одном из режимов:
+        exact - точный COUNT(*);
+        estimated - оценка планировщика PostgreSQL, либо COUNT(*),
+        закэшированный по сигнатуре фильтра на SEARCH_AMOUNT_CACHE_TTL секунд;
+        none - количество не считается вовсе.
+    """
+
+    def get_amount(self, queryset, filters: dict, mode: str = AMOUNT_EXACT):
+        if mode == AMOUNT_NONE:
+            return None
+
+        if mode == AMOUNT_ESTIMATED:
+            if connections[queryset.db].vendor == 'postgresql':
+                return self._planner_estimate(queryset)
+
+            return self._cached_count(queryset, filters)
+
+        return queryset.count()
+
+    @staticmethod
+    def _planner_estimate(queryset):
+        sql, params = queryset.query.sql_with_params()
+
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return plan[0]['Plan']['Plan Rows']
+
+    def _cached_count(self, queryset, filters: dict):
+        signature = json.dumps(filters, sort_keys=True, default=str)
+        key = 'amount:{}:{}'.format(
+            self.model._meta.label_lower,
+            hashlib.md5(signature.encode('utf-8')).hexdigest()
+        )
+
+        amount = cache.get(key)
+        if amount is None:
+            amount = queryset.count()
+            cache.set(key, amount, settings.SEARCH_AMOUNT_CACHE_TTL)
+
+        return amount
@@ -1,7 +1,10 @@
 from django.db import models
 
+from .amount import AmountMixin, AMOUNT_EXACT
+from ..search import SUBSTRING, PREFIX, normalize_name
 
-class PassportManager(models.Manager):
+
+class PassportManager(AmountMixin, models.Manager):
 
     def get_by_passport_data(self, passport_series, passport_number, excluded_id=None):
         passport = self.filter(
@@ -16,14 +19,117 @@ class PassportManager(models.Manager):
 
     def get_by_filters(
         self,
-        filters: dict = {}
+        filters: dict = {},
+        page_size: int = 50,
+        position: tuple = None,
+        backwards: bool = False,
+        amount_mode: str = AMOUNT_EXACT,
+        values: tuple = None
     ):
+        """
+        Keyset-пагинация по (created_at, id): стоимость страницы не зависит
+        от её глубины. position - (created_at, id) граничной записи,
+        backwards - листать назад от неё. С values вместо экземпляров
+        возвращаются кортежи values_list(*values). bounds - позиции первой
+        и последней записи страницы для курсоров.
+        """
         passports = self.filter(**filters)
-        amount = passports.count()
+        amount = self.get_amount(passports, filters, amount_mode)
+
+        page = passports
+        if position is not None:
+            created_at, passport_id = position
+            if backwards:
+                page = page.filter(
+                    models.Q(created_at__lt=created_at)
+                    | models.Q(created_at=created_at, id__lt=passport_id)
+                )
+            else:
+                page = page.filter(
+                    models.Q(created_at__gt=created_at)
+                    | models.Q(created_at=created_at, id__gt=passport_id)
+                )
+
+        if backwards:
+            page = page.order_by('-created_at', '-id')
+        else:
+            page = page.order_by('created_at', 'id')
+
+        if values is not None:
+            # created_at и id в хвосте кортежа нужны для курсоров.
+            page = page.values_list(*values, 'created_at', 'id')
+
+        # Одна лишняя запись показывает, есть ли что-то за пределами страницы.
+        page = list(page[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+
+        if backwards:
+            page.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        if values is not None:
+            bounds = [row[-2:] for row in page[:1] + page[-1:]]
+            page = [row[:-2] for row in page]
+        else:
+            bounds = [(passport.created_at, passport.id) for passport in page[:1] + page[-1:]]
+
+        return {
+            'passports': page,
+            'bounds': bounds,
+            'amount': amount,
+            'amount_mode': amount_mode,
+            'has_next': has_next,
+            'has_previous': has_previous
+        }
+
+    def export_rows(self, filters: dict, fields: tuple, chunk_size: int = 2000):
+        """ Итератор кортежей полей по фильтру, без создания экземпляров модели. """
+
+        return self.filter(**filters).order_by('id').values_list(
+            *fields
+        ).iterator(chunk_size=chunk_size)
+
+    def search_by_name(
+        self,
+        query: str,
+        fields: tuple = ('first_name', 'last_name'),
+        mode: str = SUBSTRING,
+        limit: int = 50,
+        values: tuple = None
+    ):
+        """
+        Ранжированный поиск по именам: точное совпадение выше совпадения
+        по префиксу, а то - выше совпадения по подстроке. С values
+        возвращаются кортежи values_list(*values).
+        """
+        query = normalize_name(query)
+        lookup = 'name_startswith' if mode == PREFIX else 'name_contains'
+
+        condition = models.Q()
+        rank = models.Value(0)
+        for field in fields:
+            column = f'{field}_search'
+            condition |= models.Q(**{f'{column}__{lookup}': query})
+            rank = rank + models.Case(
+                models.When(**{column: query}, then=models.Value(3)),
+                models.When(**{f'{column}__name_startswith': query}, then=models.Value(2)),
+                models.When(**{f'{column}__name_contains': query}, then=models.Value(1)),
+                default=models.Value(0),
+                output_field=models.IntegerField()
+            )
+
+        passports = self.filter(condition).annotate(rank=rank).order_by(
+            '-rank', 'last_name_search', 'first_name_search', 'id'
+        )
+
+        if values is not None:
+            passports = passports.values_list(*values)
 
         return {
-            'passports': passports.all(),
-            'amount': amount
+            'passports': list(passports[:limit])
         }
 
     def remove(self, passport_id):
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import BaseUserManager
 
+from .amount import AmountMixin, AMOUNT_EXACT
 
-class UserManager(BaseUserManager):
+
+class UserManager(AmountMixin, BaseUserManager):
 
     def get_by_passport_data(self, passport_series, passport_number, user_id=None):
         user = self.filter(
@@ -16,20 +18,31 @@ class UserManager(BaseUserManager):
 
     def get_by_filters(
         self,
-        filters
+        filters,
+        amount_mode: str = AMOUNT_EXACT,
+        values: tuple = None
     ):
         users = self.filter(**filters)
-        amount = users.count()
+        amount = self.get_amount(users, filters, amount_mode)
+
+        if values is not None:
+            users = users.values_list(*values)
 
         return {
             'users': users.all(),
-            'amount': amount
+            'amount': amount,
+            'amount_mode': amount_mode
         }
 
-    def create_user(self, username, email, password):
+    def create_user(self, username, email, password=None, password_hash=None):
 
         user = self.model(username=username, email=self.normalize_email(email))
-        user.set_password(password)
+
+        if password_hash is not None:
+            user.password = password_hash
+        else:
+            user.set_password(password)
+
         user.save()
 
         return user
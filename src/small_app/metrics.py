@@ -0,0 +1,393 @@
+"""
+Метрики в формате Prometheus без внешних зависимостей. Значения каждого
+процесса лежат в mmap-файле METRICS_DIR/<pid>.db, /metrics суммирует все
+файлы каталога, поэтому счётчики gunicorn-воркеров складываются. Без
+METRICS_DIR значения хранятся в памяти процесса.
+"""
+import asyncio
+import glob
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0)
+HASH_BUCKETS = (.01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+
+INF = float('inf')
+
+
+class MemoryValues:
+    """ Значения процесса в словаре. """
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        with self.lock:
+            return dict(self.values)
+
+
+class MmapValues:
+    """
+    Значения процесса в mmap-файле: заголовок из 8 байт с занятым размером,
+    затем записи [длина ключа, ключ, выравнивание до 8, double]. Пишет
+    только свой процесс, читать файл можно из любого.
+    """
+
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(self.INITIAL_SIZE)
+
+        self.mm = mmap.mmap(self.file.fileno(), os.fstat(self.file.fileno()).st_size)
+        self.used = struct.unpack_from('<i', self.mm, 0)[0] or 8
+        struct.pack_into('<i', self.mm, 0, self.used)
+
+        self.positions = {key: position for key, _, position in self.entries(self.mm, self.used)}
+
+    @staticmethod
+    def entries(data, used):
+        position = 8
+
+        while position < used:
+            length = struct.unpack_from('<i', data, position)[0]
+            key_end = position + 4 + length
+            value_position = key_end + (-key_end % 8)
+
+            key = bytes(data[position + 4:key_end]).decode('utf-8')
+            value = struct.unpack_from('<d', data, value_position)[0]
+
+            yield key, value, value_position
+            position = value_position + 8
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        if len(data) < 8:
+            return {}
+
+        return {key: value for key, value, _ in cls.entries(data, struct.unpack_from('<i', data, 0)[0])}
+
+    def add(self, key):
+        encoded = key.encode('utf-8')
+        key_end = self.used + 4 + len(encoded)
+        value_position = key_end + (-key_end % 8)
+        end = value_position + 8
+
+        if end > len(self.mm):
+            size = len(self.mm)
+            while end > size:
+                size *= 2
+
+            self.mm.close()
+            self.file.truncate(size)
+            self.mm = mmap.mmap(self.file.fileno(), size)
+
+        struct.pack_into(f'<i{len(encoded)}s', self.mm, self.used, len(encoded), encoded)
+        struct.pack_into('<d', self.mm, value_position, 0.0)
+
+        # Размер обновляется последним: читатель не увидит запись наполовину.
+        self.used = end
+        struct.pack_into('<i', self.mm, 0, self.used)
+        self.positions[key] = value_position
+
+        return value_position
+
+    def inc(self, key, amount):
+        with self.lock:
+            position = self.positions.get(key) or self.add(key)
+            value = struct.unpack_from('<d', self.mm, position)[0]
+            struct.pack_into('<d', self.mm, position, value + amount)
+
+    def items(self):
+        return self.read(self.path)
+
+
+class Registry:
+    """ Объявленные метрики и хранилище значений текущего процесса. """
+
+    def __init__(self):
+        self.metrics = []
+        self.storage = None
+        self.storage_key = None
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def values(self):
+        # После fork воркер пишет в свой файл, а не в файл мастера.
+        key = (os.getpid(), settings.METRICS_DIR)
+
+        if self.storage_key != key:
+            with self.lock:
+                if self.storage_key != key:
+                    if settings.METRICS_DIR:
+                        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                        self.storage = MmapValues(
+                            os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db')
+                        )
+                    else:
+                        self.storage = MemoryValues()
+                    self.storage_key = key
+
+        return self.storage
+
+    def collect(self):
+        """ Значения всех процессов: суммы по файлам METRICS_DIR. """
+
+        if not settings.METRICS_DIR:
+            return self.values().items()
+
+        values = {}
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+            for key, value in MmapValues.read(path).items():
+                values[key] = values.get(key, 0.0) + value
+
+        return values
+
+    def exposition(self):
+        """ Текстовый формат Prometheus. """
+
+        samples = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            samples.setdefault(name, []).append((tuple(map(tuple, labels)), value))
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples(samples))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def format_value(value):
+    if value == INF:
+        return '+Inf'
+
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels
+    )
+
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def labels(self, values):
+        if set(values) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(values)}')
+
+        return tuple((name, str(values[name])) for name in self.labelnames)
+
+    @staticmethod
+    def key(sample, labels):
+        return json.dumps([sample, labels], separators=(',', ':'))
+
+    def inc_sample(self, sample, labels, amount):
+        if settings.METRICS_ENABLED:
+            registry.values().inc(self.key(sample, labels), amount)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.inc_sample(self.name, self.labels(labels), amount)
+
+    def samples(self, samples):
+        for labels, value in sorted(samples.get(self.name, ())):
+            yield f'{self.name}{format_labels(labels)} {format_value(value)}'
+
+
+class Histogram(Metric):
+    """
+    Гистограмма с фиксированными границами. В хранилище на наблюдение
+    пишутся три значения: первая подходящая корзина, сумма и число;
+    накопительные корзины собираются при выдаче.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (INF,)
+
+    def observe(self, value, **labels):
+        labels = self.labels(labels)
+        bucket = next(bound for bound in self.buckets if value <= bound)
+
+        self.inc_sample(f'{self.name}_bucket', labels + (('le', format_value(bucket)),), 1)
+        self.inc_sample(f'{self.name}_sum', labels, value)
+        self.inc_sample(f'{self.name}_count', labels, 1)
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def samples(self, samples):
+        buckets = {}
+        for labels, value in samples.get(f'{self.name}_bucket', ()):
+            labels = dict(labels)
+            bound = labels.pop('le')
+            buckets.setdefault(tuple(labels.items()), {})[bound] = value
+
+        sums = dict(samples.get(f'{self.name}_sum', ()))
+        counts = dict(samples.get(f'{self.name}_count', ()))
+
+        for labels in sorted(counts):
+            total = 0.0
+            for bound in self.buckets:
+                total += buckets.get(labels, {}).get(format_value(bound), 0.0)
+                bucket_labels = labels + (('le', format_value(bound)),)
+                yield f'{self.name}_bucket{format_labels(bucket_labels)} {format_value(total)}'
+
+            yield f'{self.name}_sum{format_labels(labels)} {format_value(sums.get(labels, 0.0))}'
+            yield f'{self.name}_count{format_labels(labels)} {format_value(counts[labels])}'
+
+
+class Timer:
+    """ with histogram.time(**labels): наблюдение длительности блока. """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+http_requests = Counter(
+    'http_requests_total', 'HTTP requests by view, method and status.',
+    ('view', 'method', 'status')
+)
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by view and method.',
+    ('view', 'method')
+)
+jwt_authentications = Counter(
+    'jwt_authentications_total', 'JWTAuthentication outcomes.', ('outcome',)
+)
+password_hash_duration = Histogram(
+    'password_hash_duration_seconds', 'Password hashing time on login, including pool wait.',
+    ('operation',), buckets=HASH_BUCKETS
+)
+db_queries = Counter(
+    'db_queries_total', 'Database queries by view.', ('view',)
+)
+db_query_duration = Counter(
+    'db_query_duration_seconds_total', 'Database query time by view.', ('view',)
+)
+cache_requests = Counter(
+    'cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result')
+)
+
+
+def scrape_allowed(request):
+    """
+    Доступ к /metrics: заголовок Authorization: Bearer METRICS_TOKEN или
+    адрес клиента из METRICS_ALLOWED_IPS.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        provided = request.META.get('HTTP_AUTHORIZATION', '')
+
+        if hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8')):
+            return True
+
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+
+    if match is None:
+        return 'unmatched'
+
+    return match.view_name or match.route
+
+
+def observe(request, response, started):
+    view = view_name(request)
+
+    http_request_duration.observe(time.perf_counter() - started, view=view, method=request.method)
+    http_requests.inc(view=view, method=request.method, status=response.status_code)
+
+    stats = getattr(response, 'query_stats', None)
+    if stats is not None:
+        db_queries.inc(stats.count, view=view)
+        db_query_duration.inc(stats.duration, view=view)
+
+    return response
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """
+    Латентность и статусы ответов по именам URL, число и время запросов к БД
+    из QueryStatsMiddleware (должен стоять после этого middleware).
+    """
+
+    if not settings.METRICS_ENABLED:
+        raise MiddlewareNotUsed()
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            response = await get_response(request)
+
+            return observe(request, response, started)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            response = get_response(request)
+
+            return observe(request, response, started)
+
+    return middleware
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('small_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passport',
+            index=models.Index(fields=['created_at', 'id'], name='passport_created_id_idx'),
+        ),
+    ]
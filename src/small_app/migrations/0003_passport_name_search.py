@@ -0,0 +1,48 @@
+# Generated by Django 4.0.4 on 2026-10-18 19:40
+
+from django.db import migrations
+import small_app.search
+
+
+def fill_name_search(apps, schema_editor):
+    Passport = apps.get_model('small_app', 'Passport')
+
+    passports = Passport.objects.only('first_name', 'last_name')
+    for passport in passports.iterator(chunk_size=2000):
+        passport.first_name_search = small_app.search.normalize_name(passport.first_name)
+        passport.last_name_search = small_app.search.normalize_name(passport.last_name)
+        passport.save(update_fields=['first_name_search', 'last_name_search'])
+
+
+def install_name_search(apps, schema_editor):
+    small_app.search.install_name_search(
+        apps.get_model('small_app', 'Passport'), schema_editor
+    )
+
+
+def uninstall_name_search(apps, schema_editor):
+    small_app.search.uninstall_name_search(
+        apps.get_model('small_app', 'Passport'), schema_editor
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('small_app', '0002_passport_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passport',
+            name='first_name_search',
+            field=small_app.search.SearchNameField(db_index=True, default='', editable=False, max_length=255, source='first_name'),
+        ),
+        migrations.AddField(
+            model_name='passport',
+            name='last_name_search',
+            field=small_app.search.SearchNameField(db_index=True, default='', editable=False, max_length=255, source='last_name'),
+        ),
+        migrations.RunPython(fill_name_search, migrations.RunPython.noop),
+        migrations.RunPython(install_name_search, uninstall_name_search),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import small_app.search
+
+
+def remove_duplicates(apps, schema_editor):
+    # Гонка проверки и вставки могла создать одинаковые серию и номер:
+    # остаётся запись с наименьшим id, остальные удаляются.
+    Passport = apps.get_model('small_app', 'Passport')
+    duplicates = (
+        Passport.objects.values('passport_series', 'passport_number')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+
+    for duplicate in duplicates:
+        Passport.objects.filter(
+            passport_series=duplicate['passport_series'],
+            passport_number=duplicate['passport_number'],
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+def install_name_search(apps, schema_editor):
+    # На sqlite AddConstraint пересоздаёт таблицу вместе с её триггерами.
+    small_app.search.install_name_search(
+        apps.get_model('small_app', 'Passport'), schema_editor
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('small_app', '0003_passport_name_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='passport',
+            constraint=models.UniqueConstraint(fields=('passport_series', 'passport_number'), name='passport_series_number_unique'),
+        ),
+        migrations.RunPython(install_name_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.4 on 2026-10-18 19:58
+
+from django.db import migrations, models
+import small_app.search
+
+
+def fill_updated_at(apps, schema_editor):
+    Passport = apps.get_model('small_app', 'Passport')
+    Passport.objects.update(updated_at=models.F('created_at'))
+
+
+def install_name_search(apps, schema_editor):
+    # На sqlite AddField пересоздаёт таблицу вместе с её триггерами.
+    small_app.search.install_name_search(
+        apps.get_model('small_app', 'Passport'), schema_editor
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('small_app', '0005_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(install_name_search, migrations.RunPython.noop),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
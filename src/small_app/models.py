@@ -3,11 +3,13 @@ import jwt
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 
 from django.db import models
 
 from .managers import UserManager, PassportManager
+from .search import SearchNameField
 
 
 # Create your models here.
@@ -17,6 +19,8 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Увеличивается при смене пароля - старые токены перестают действовать.
+    token_version = models.PositiveIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -29,6 +33,25 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.username
 
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+
+        if self.pk is not None:
+            self.token_version += 1
+
+    def check_password(self, raw_password):
+        """
+        Как AbstractBaseUser.check_password, но перехэширование при входе
+        (смена хэшера или его параметров) не отзывает выданные токены.
+        """
+
+        def setter(raw_password):
+            super(User, self).set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter)
+
     @property
     def token(self):
         return self._generate_jwt_token()
@@ -40,6 +63,9 @@ class User(AbstractBaseUser, PermissionsMixin):
         token = jwt.encode({
             'id': self.pk,
             'username': self.username,
+            'is_staff': self.is_staff,
+            'is_active': self.is_active,
+            'ver': self.token_version,
             'exp': int(dt.strftime('%s'))
         }, settings.SECRET_KEY, algorithm='HS256')
 
@@ -53,8 +79,29 @@ class Passport(models.Model):
     passport_series = models.SmallIntegerField(null=False)
     passport_number = models.SmallIntegerField(null=False)
 
+    first_name_search = SearchNameField(source='first_name')
+    last_name_search = SearchNameField(source='last_name')
+
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     objects = PassportManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='passport_created_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['passport_series', 'passport_number'],
+                name='passport_series_number_unique'
+            ),
+        ]
+
     def __str__(self):
         return self.first_name + self.last_name
+
+    @property
+    def etag(self):
+        """ Версия записи для ETag, меняется при каждом сохранении. """
+
+        return f'"{self.pk}-{int(self.updated_at.timestamp() * 1000000)}"'
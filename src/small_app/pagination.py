@@ -0,0 +1,148 @@
+import base64
+import binascii
+import json
+
+from datetime import datetime
+
+from django.conf import settings
+
+from rest_framework import exceptions
+
+from .managers import AMOUNT_MODES
+from .fast_serializers import LAYOUT_OBJECTS, LAYOUTS
+
+
+NEXT = 'next'
+PREVIOUS = 'previous'
+
+
+def encode_cursor(created_at: datetime, object_id: int, direction: str):
+    """ Кодирует позицию (created_at, id) и направление в непрозрачный курсор. """
+
+    raw = json.dumps([created_at.isoformat(), object_id, direction])
+
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str):
+    """
+    Декодирует курсор, возвращает кортеж (created_at, id, direction).
+    Любой некорректный курсор приводит к ValidationError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        created_at, object_id, direction = json.loads(raw)
+        created_at = datetime.fromisoformat(created_at)
+        object_id = int(object_id)
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise exceptions.ValidationError(
+            detail={'cursor': 'Invalid cursor'},
+            code=400
+        )
+
+    if direction not in (NEXT, PREVIOUS):
+        raise exceptions.ValidationError(
+            detail={'cursor': 'Invalid cursor'},
+            code=400
+        )
+
+    return created_at, object_id, direction
+
+
+def get_position(query_params):
+    """ Позиция и направление keyset-пагинации из query-параметра cursor. """
+
+    cursor = query_params.get('cursor', None)
+
+    if not cursor:
+        return None, False
+
+    created_at, object_id, direction = decode_cursor(cursor)
+
+    return (created_at, object_id), direction == PREVIOUS
+
+
+def get_page_size(query_params):
+    """ Размер страницы из query-параметра page_size, ограниченный сверху. """
+
+    page_size = query_params.get('page_size', None)
+
+    if page_size is None:
+        return settings.PASSPORTS_PAGE_SIZE
+
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise exceptions.ValidationError(
+            detail={'page_size': 'A valid integer is required'},
+            code=400
+        )
+
+    if page_size < 1:
+        raise exceptions.ValidationError(
+            detail={'page_size': 'Ensure this value is greater than or equal to 1'},
+            code=400
+        )
+
+    return min(page_size, settings.PASSPORTS_MAX_PAGE_SIZE)
+
+
+def get_amount_mode(query_params):
+    """ Режим подсчёта amount из query-параметра amount (exact/estimated/none). """
+
+    amount_mode = query_params.get('amount', settings.SEARCH_AMOUNT_MODE)
+
+    if amount_mode not in AMOUNT_MODES:
+        raise exceptions.ValidationError(
+            detail={'amount': f'Must be one of: {", ".join(AMOUNT_MODES)}'},
+            code=400
+        )
+
+    return amount_mode
+
+
+def get_layout(request):
+    """
+    Раскладка списков из query-параметра layout или из параметра layout
+    в Accept (application/json; layout=columnar).
+    """
+    layout = request.GET.get('layout', None)
+
+    if layout is None:
+        for media_type in request.META.get('HTTP_ACCEPT', '').split(','):
+            for param in media_type.split(';')[1:]:
+                name, _, value = param.strip().partition('=')
+                if name == 'layout':
+                    layout = value.strip()
+
+    layout = layout or LAYOUT_OBJECTS
+
+    if layout not in LAYOUTS:
+        raise exceptions.ValidationError(
+            detail={'layout': f'Must be one of: {", ".join(LAYOUTS)}'},
+            code=400
+        )
+
+    return layout
+
+
+def get_fields(query_params, declared):
+    """
+    Набор полей из query-параметра fields (через запятую), проверенный
+    по объявленным полям сериализатора. None - все поля.
+    """
+    fields = query_params.get('fields', None)
+
+    if not fields:
+        return None
+
+    fields = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = fields - set(declared)
+
+    if not fields or unknown:
+        raise exceptions.ValidationError(
+            detail={'fields': f'Must be a subset of: {", ".join(declared)}'},
+            code=400
+        )
+
+    return tuple(name for name in declared if name in fields)
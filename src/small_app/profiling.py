@@ -0,0 +1,324 @@
+"""
+Профилирование горячих путей. Два независимых режима, оба выключены по
+умолчанию и не стоят ничего, пока выключены (middleware снимает себя
+через MiddlewareNotUsed):
+
+- PROFILING_ENABLED: cProfile одного запроса по заголовку X-Profile или
+  параметру ?profile= от staff-пользователя. Статистика возвращается
+  текстом вместо ответа или сохраняется в PROFILING_DIR;
+- PROFILING_SAMPLER_ENABLED: фоновый поток раз в PROFILING_SAMPLE_INTERVAL_MS
+  снимает стеки потоков, которые сейчас обрабатывают запросы, и копит их
+  в формате collapsed stacks (flamegraph.pl, speedscope, inferno).
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from rest_framework import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+TEXT = 'text'
+STORE = 'store'
+PROFILE_MODES = (TEXT, STORE)
+
+# Один cProfile на процесс: профилировщики в одном потоке мешают друг
+# другу, а в async-режиме все запросы идут через один поток event loop.
+profile_lock = threading.Lock()
+
+
+def get_profile_mode(request):
+    """ Режим из X-Profile или ?profile=: text, store или None. """
+
+    value = request.META.get('HTTP_X_PROFILE') or request.GET.get('profile')
+
+    if not value:
+        return None
+
+    value = value.lower()
+
+    if value in PROFILE_MODES:
+        return value
+
+    if value in ('1', 'true'):
+        return STORE if settings.PROFILING_DIR else TEXT
+
+    return None
+
+
+def is_staff(result):
+    return result is not None and result[0].is_staff
+
+
+def authenticate_staff(request):
+    """ Профилировать можно только staff; токен проверяется до представления. """
+
+    from .backends import JWTAuthentication
+
+    authentication = JWTAuthentication()
+    token = authentication.get_token(request)
+
+    if token is None:
+        return False
+
+    try:
+        return is_staff(authentication._authenticate_credentials(request, token))
+    except exceptions.AuthenticationFailed:
+        return False
+
+
+async def aauthenticate_staff(request):
+    from .backends import JWTAuthentication
+
+    try:
+        return is_staff(await JWTAuthentication().aauthenticate(request))
+    except exceptions.AuthenticationFailed:
+        return False
+
+
+def profile_filename(request):
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-') or 'root'
+
+    return f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{request.method}-{slug}.prof'
+
+
+def profile_response(request, response, profiler, mode):
+    """ Текстовый отчёт вместо ответа или .prof-файл в PROFILING_DIR. """
+
+    if mode == STORE and settings.PROFILING_DIR:
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        filename = profile_filename(request)
+        profiler.dump_stats(os.path.join(settings.PROFILING_DIR, filename))
+        response['X-Profile-File'] = filename
+
+        return response
+
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.PROFILING_TOP_FUNCTIONS)
+
+    profiled = HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+    profiled['X-Profiled-Status'] = str(response.status_code)
+
+    return profiled
+
+
+class StackSampler:
+    """
+    Семплирующий профилировщик. Снимает стеки только потоков, отмеченных
+    enter()/exit(), поэтому простаивающие воркеры не попадают в отчёт.
+    Число разных стеков ограничено max_stacks, остальные идут в dropped.
+    """
+
+    def __init__(self, interval=0.01, max_stacks=10000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        # После fork (gunicorn --preload) поток остался в родителе.
+        if self.thread is not None and self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+            self.thread.start()
+
+    def enter(self):
+        ident = threading.get_ident()
+
+        with self.lock:
+            self.active[ident] += 1
+
+        return ident
+
+    def exit(self, ident):
+        with self.lock:
+            self.active[ident] -= 1
+            if self.active[ident] <= 0:
+                del self.active[ident]
+
+    @staticmethod
+    def collapse(frame):
+        """ Стек от корня к листу: module:function через ';'. """
+
+        names = []
+        while frame is not None:
+            names.append(f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+            frame = frame.f_back
+
+        return ';'.join(reversed(names))
+
+    def sample(self):
+        with self.lock:
+            idents = list(self.active)
+
+        if not idents:
+            return
+
+        frames = sys._current_frames()
+        stacks = [self.collapse(frames[ident]) for ident in idents if ident in frames]
+
+        with self.lock:
+            for stack in stacks:
+                self.samples += 1
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                else:
+                    self.dropped += 1
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:  # pragma: no cover
+                logger.exception('stack sampling failed')
+
+    def folded(self):
+        """ Строки "стек число" для flamegraph.pl и совместимых инструментов. """
+
+        with self.lock:
+            stacks = self.stacks.most_common()
+
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'running': self.thread is not None and self.pid == os.getpid(),
+                'interval_ms': round(1000 * self.interval, 3),
+                'samples': self.samples,
+                'stacks': len(self.stacks),
+                'dropped': self.dropped,
+                'active_threads': len(self.active),
+            }
+
+
+sampler = StackSampler(
+    interval=settings.PROFILING_SAMPLE_INTERVAL_MS / 1000,
+    max_stacks=settings.PROFILING_MAX_STACKS
+)
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    """
+    Профилирование запросов: cProfile по запросу staff-пользователя
+    (PROFILING_ENABLED) и семплирование стеков (PROFILING_SAMPLER_ENABLED).
+    Если оба режима выключены, middleware не подключается.
+    """
+
+    if not settings.PROFILING_ENABLED and not settings.PROFILING_SAMPLER_ENABLED:
+        raise MiddlewareNotUsed()
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def sampled(request):
+            if not settings.PROFILING_SAMPLER_ENABLED:
+                return await get_response(request)
+
+            # Не в фабрике middleware: с preload_app она работает в мастере
+            # gunicorn, и поток семплера не переживает fork в воркеры.
+            sampler.start()
+            ident = sampler.enter()
+            try:
+                return await get_response(request)
+            finally:
+                sampler.exit(ident)
+
+        async def middleware(request):
+            mode = settings.PROFILING_ENABLED and get_profile_mode(request)
+
+            if not mode or not await aauthenticate_staff(request):
+                return await sampled(request)
+
+            if not profile_lock.acquire(blocking=False):
+                response = await sampled(request)
+                response['X-Profile'] = 'busy'
+                return response
+
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = await sampled(request)
+                finally:
+                    profiler.disable()
+            finally:
+                profile_lock.release()
+
+            return profile_response(request, response, profiler, mode)
+    else:
+        def sampled(request):
+            if not settings.PROFILING_SAMPLER_ENABLED:
+                return get_response(request)
+
+            # Не в фабрике middleware: с preload_app она работает в мастере
+            # gunicorn, и поток семплера не переживает fork в воркеры.
+            sampler.start()
+            ident = sampler.enter()
+            try:
+                return get_response(request)
+            finally:
+                sampler.exit(ident)
+
+        def middleware(request):
+            mode = settings.PROFILING_ENABLED and get_profile_mode(request)
+
+            if not mode or not authenticate_staff(request):
+                return sampled(request)
+
+            if not profile_lock.acquire(blocking=False):
+                response = sampled(request)
+                response['X-Profile'] = 'busy'
+                return response
+
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = sampled(request)
+                    # Потоковый ответ (экспорт) работает при чтении тела,
+                    # в режиме text оно всё равно заменяется отчётом.
+                    if mode == TEXT and response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                finally:
+                    profiler.disable()
+            finally:
+                profile_lock.release()
+
+            return profile_response(request, response, profiler, mode)
+
+    return middleware
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+
+logger = logging.getLogger(__name__)
+
+LOG = 'log'
+RAISE = 'raise'
+OFF = 'off'
+BUDGET_ACTIONS = (LOG, RAISE, OFF)
+
+# Управление транзакциями не считается: в тестах каждый atomic даёт
+# SAVEPOINT, в работе - BEGIN, и бюджеты разъезжались бы.
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+current_stats = ContextVar('query_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """ Запросы к БД в рамках одного HTTP-запроса. """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        """ SQL, выполненные не меньше threshold раз: признак N+1. """
+
+        return [(sql, count) for sql, count in self.statements.items() if count >= threshold]
+
+    def server_timing(self):
+        return 'db;dur=%.3f;desc="%d queries"' % (1000 * self.duration, self.count)
+
+
+def record_query(execute, sql, params, many, context):
+    """ execute_wrapper соединения: учитывает запрос в текущем QueryStats. """
+
+    stats = current_stats.get()
+
+    if stats is None or sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection):
+    """ Вызывается из connection_created: обёртка ставится один раз на соединение. """
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def query_budget(budget):
+    """
+    Объявляет бюджет запросов для представления-класса или функции: число
+    или словарь {метод: число}.
+    """
+
+    def decorator(view):
+        view.query_budget = budget
+        return view
+
+    return decorator
+
+
+def get_budget(request):
+    match = getattr(request, 'resolver_match', None)
+
+    if match is None:
+        return None
+
+    view = getattr(match.func, 'view_class', match.func)
+    budget = getattr(view, 'query_budget', None)
+
+    if isinstance(budget, dict):
+        return budget.get(request.method, None)
+
+    return budget
+
+
+def check_budget(request, stats):
+    threshold = settings.QUERY_N_PLUS_ONE_THRESHOLD
+
+    for sql, count in stats.repeated(threshold):
+        logger.warning('%s %s: query repeated %d times: %s', request.method, request.path, count, sql)
+
+    budget = get_budget(request)
+
+    if budget is None or stats.count <= budget:
+        return
+
+    message = '%s %s: %d queries, budget %d' % (request.method, request.path, stats.count, budget)
+
+    if settings.QUERY_BUDGET_ACTION == RAISE:
+        raise QueryBudgetExceeded(message)
+
+    logger.warning(message)
+
+
+def finish(request, response, stats):
+    response.query_stats = stats
+
+    if settings.QUERY_SERVER_TIMING:
+        timing = response.get('Server-Timing')
+        response['Server-Timing'] = (
+            f'{timing}, {stats.server_timing()}' if timing else stats.server_timing()
+        )
+
+    if settings.QUERY_BUDGET_ACTION != OFF:
+        check_budget(request, stats)
+
+    return response
+
+
+@sync_and_async_middleware
+def QueryStatsMiddleware(get_response):
+    """
+    Считает запросы к БД и их время на каждый HTTP-запрос, отдаёт их в
+    заголовке Server-Timing и сверяет с бюджетом представления
+    (query_budget): превышение пишется в лог или, при
+    QUERY_BUDGET_ACTION=raise, вызывает QueryBudgetExceeded.
+    """
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats = QueryStats()
+            token = current_stats.set(stats)
+            try:
+                response = await get_response(request)
+            finally:
+                current_stats.reset(token)
+
+            return finish(request, response, stats)
+    else:
+        def middleware(request):
+            stats = QueryStats()
+            token = current_stats.set(stats)
+            try:
+                response = get_response(request)
+            finally:
+                current_stats.reset(token)
+
+            return finish(request, response, stats)
+
+    return middleware
@@ -1,21 +1,73 @@
 import json
 
+from django.conf import settings
+
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+ORJSON = 'orjson'
+STDLIB = 'json'
+
+# Типы, которых orjson не знает (Decimal, lazy-строки, bytes токена),
+# кодируются так же, как в DRF.
+encoder = JSONEncoder()
+
+
+def orjson_dumps(data):
+    return orjson.dumps(
+        data,
+        default=encoder.default,
+        option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def stdlib_dumps(data):
+    return json.dumps(
+        data,
+        cls=JSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
 
-class UserJSONRenderer(JSONRenderer):
-    charset = 'utf-8'
 
-    def render(self, data, media_type=None, renderer_context=None):
+def get_dumps(backend=None):
+    """ Функция сериализации для JSON_RENDERER_BACKEND, без orjson - stdlib. """
 
-        errors = data.get('errors', None)
+    backend = backend or settings.JSON_RENDERER_BACKEND
 
-        if errors is not None:
-            return super(UserJSONRenderer, self).render(data)
+    if backend == ORJSON and orjson is not None:
+        return orjson_dumps
 
-        token = data.get('token', None)
+    return stdlib_dumps
 
-        if token is not None and isinstance(token, bytes):
-            data['token'] = token.decode('utf-8')
 
-        return json.dumps(data)
\ No newline at end of file
+def dumps(data):
+    """ Сериализует data в JSON и возвращает bytes. """
+
+    return get_dumps()(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, который сразу отдаёт bytes через orjson (или компактный
+    stdlib json). Ответы с отступами для браузера рендерит сам DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
+
+
+class UserJSONRenderer(FastJSONRenderer):
+    charset = 'utf-8'
@@ -0,0 +1,128 @@
+import random
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+# Отметка о записи хранится у клиента в подписанной cookie: её видит любой
+# воркер, а кэш в памяти процесса - только тот, что обработал запись.
+PIN_COOKIE = 'replica_pin'
+PIN_SALT = 'small_app.routers.replica_pin'
+
+
+def pin_to_primary(response, user_id):
+    """ После записи клиент REPLICA_STICKY_SECONDS секунд читает с основной БД. """
+
+    response.set_signed_cookie(
+        PIN_COOKIE,
+        str(user_id),
+        salt=PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax'
+    )
+
+
+def request_user_id(request):
+    """ id клиента без загрузки stateless-пользователя; None для анонимов. """
+
+    return getattr(getattr(request, 'user', None), 'id', None)
+
+
+def is_pinned(request):
+    user_id = request_user_id(request)
+
+    if user_id is None:
+        return False
+
+    # max_age проверяется по подписанной метке времени, а не только браузером.
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT, max_age=settings.REPLICA_STICKY_SECONDS
+    )
+
+    return pinned == str(user_id)
+
+
+@contextmanager
+def read_from_replica(request=None):
+    """ Чтения внутри блока уходят на реплику, если клиент не закреплён. """
+
+    if not settings.DATABASE_REPLICAS or request is not None and is_pinned(request):
+        yield
+        return
+
+    token = replica_reads.set(True)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def use_replica(method):
+    """ Декоратор GET-обработчиков APIView: чтения идут на реплики. """
+
+    @wraps(method)
+    def wrapped(self, request, *args, **kwargs):
+        with read_from_replica(request):
+            return method(self, request, *args, **kwargs)
+
+    return wrapped
+
+
+class ReplicaRouter:
+    """
+    Запись и чтение по умолчанию идут в default. Чтения внутри
+    read_from_replica распределяются по DATABASE_REPLICAS случайно.
+    Схема на реплики приходит репликацией, поэтому миграции на них не идут.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Только модели приложения: кэш в БД (состояния JWT) читается
+        # с основной БД, иначе отставание реплики вернуло бы старое состояние.
+        if (
+            replica_reads.get()
+            and settings.DATABASE_REPLICAS
+            and model._meta.app_label == 'small_app'
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """ Закрепляет за основной БД клиентов, которые только что писали. """
+
+    def process_response(self, request, response):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and settings.DATABASE_REPLICAS
+        ):
+            user_id = request_user_id(request)
+
+            if user_id is not None:
+                pin_to_primary(response, user_id)
+
+        return response
@@ -0,0 +1,236 @@
+import sqlite3
+
+from functools import lru_cache
+
+from django.db import models
+
+
+SUBSTRING = 'substring'
+PREFIX = 'prefix'
+SEARCH_MODES = (SUBSTRING, PREFIX)
+
+# Триграммный индекс не может искать подстроки короче трёх символов.
+TRIGRAM_LENGTH = 3
+
+
+def normalize_name(value):
+    """ Приводит имя к поисковой форме: casefold и замена ё на е. """
+
+    if value is None:
+        return ''
+
+    return str(value).casefold().replace('ё', 'е')
+
+
+@lru_cache(maxsize=None)
+def trigram_fts_supported():
+    """ Поддерживает ли sqlite токенизатор trigram для FTS5 (SQLite >= 3.34). """
+
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute(
+            "CREATE VIRTUAL TABLE probe USING fts5(name, tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+    return True
+
+
+def name_fts_table(model):
+    return f'{model._meta.db_table}_name_fts'
+
+
+def search_name_columns(model):
+    return [
+        field.column for field in model._meta.get_fields()
+        if isinstance(field, SearchNameField)
+    ]
+
+
+class SearchNameField(models.CharField):
+    """
+    Нормализованная копия поля source, которая заполняется при сохранении
+    (в том числе через bulk_create). QuerySet.update() её не пересчитывает.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 255)
+        kwargs.setdefault('default', '')
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = normalize_name(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+
+        return value
+
+
+class NameLookupMixin:
+
+    def get_prep_lookup(self):
+        return normalize_name(self.rhs)
+
+    def process_rhs(self, compiler, connection):
+        sql, params = super().process_rhs(compiler, connection)
+
+        return sql, [self.prepare_pattern(connection, param) for param in params]
+
+    @staticmethod
+    def escape_like(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@SearchNameField.register_lookup
+class NameContains(NameLookupMixin, models.Lookup):
+    """
+    Поиск подстроки. На sqlite использует триграммный FTS5-индекс,
+    на PostgreSQL - LIKE, который обслуживает GIN-индекс gin_trgm_ops.
+    """
+    lookup_name = 'name_contains'
+
+    def use_fts(self, connection):
+        return (
+            connection.vendor == 'sqlite'
+            and trigram_fts_supported()
+            and len(self.rhs) >= TRIGRAM_LENGTH
+        )
+
+    def prepare_pattern(self, connection, value):
+        if self.use_fts(connection):
+            return '"{}"'.format(value.replace('"', '""'))
+
+        return '%{}%'.format(self.escape_like(value))
+
+    def as_sql(self, compiler, connection):
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+
+        if self.use_fts(connection):
+            qn = compiler.quote_name_unless_alias
+            model = self.lhs.target.model
+            fts_table = qn(name_fts_table(model))
+
+            sql = '{}.{} IN (SELECT rowid FROM {} WHERE {} MATCH {})'.format(
+                qn(self.lhs.alias), qn(model._meta.pk.column),
+                fts_table, qn(self.lhs.target.column), rhs_sql
+            )
+
+            return sql, rhs_params
+
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+
+        return f"{lhs_sql} LIKE {rhs_sql} ESCAPE '\\'", lhs_params + rhs_params
+
+
+@SearchNameField.register_lookup
+class NameStartsWith(NameLookupMixin, models.Lookup):
+    """ Поиск по префиксу, обслуживается обычным B-tree индексом. """
+    lookup_name = 'name_startswith'
+
+    def prepare_pattern(self, connection, value):
+        return '{}%'.format(self.escape_like(value))
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+
+        if connection.vendor == 'sqlite':
+            # LIKE с ESCAPE на sqlite не использует индекс, а диапазон - использует.
+            sql = f'{lhs_sql} >= %s AND {lhs_sql} < %s'
+            params = lhs_params + [self.rhs] + lhs_params + [self.rhs + '\U0010ffff']
+
+            return sql, params
+
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+
+        return f"{lhs_sql} LIKE {rhs_sql} ESCAPE '\\'", lhs_params + rhs_params
+
+
+def install_name_search(model, schema_editor):
+    """
+    Создаёт индекс поиска по именам для model. Вызывается из миграций;
+    на sqlite триггеры теряются при пересоздании таблицы, поэтому миграции,
+    которые пересоздают таблицу, должны вызывать его повторно.
+    """
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    columns = search_name_columns(model)
+    qn = schema_editor.quote_name
+
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in columns:
+            schema_editor.execute(
+                'CREATE INDEX IF NOT EXISTS {} ON {} USING gin ({} gin_trgm_ops)'.format(
+                    qn(f'{table}_{column}_trgm'), qn(table), qn(column)
+                )
+            )
+        return
+
+    if connection.vendor != 'sqlite' or not trigram_fts_supported():
+        return
+
+    fts_table = name_fts_table(model)
+    pk = model._meta.pk.column
+    fts_columns = ', '.join(qn(column) for column in columns)
+    new_values = ', '.join(f'new.{qn(column)}' for column in columns)
+    old_values = ', '.join(f'old.{qn(column)}' for column in columns)
+    insert_new = 'INSERT INTO {0}(rowid, {1}) VALUES (new.{2}, {3});'.format(
+        qn(fts_table), fts_columns, qn(pk), new_values
+    )
+    delete_old = "INSERT INTO {0}({0}, rowid, {1}) VALUES ('delete', old.{2}, {3});".format(
+        qn(fts_table), fts_columns, qn(pk), old_values
+    )
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5({}, content={}, "
+        "content_rowid={}, tokenize='trigram')".format(
+            qn(fts_table), fts_columns, qn(table), qn(pk)
+        )
+    )
+    for suffix, event, body in (
+        ('ai', 'INSERT', insert_new),
+        ('ad', 'DELETE', delete_old),
+        ('au', 'UPDATE', delete_old + ' ' + insert_new),
+    ):
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS {} AFTER {} ON {} BEGIN {} END'.format(
+                qn(f'{fts_table}_{suffix}'), event, qn(table), body
+            )
+        )
+    schema_editor.execute(
+        "INSERT INTO {0}({0}) VALUES ('rebuild')".format(qn(fts_table))
+    )
+
+
+def uninstall_name_search(model, schema_editor):
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    qn = schema_editor.quote_name
+
+    if connection.vendor == 'postgresql':
+        for column in search_name_columns(model):
+            schema_editor.execute(
+                'DROP INDEX IF EXISTS {}'.format(qn(f'{table}_{column}_trgm'))
+            )
+        return
+
+    if connection.vendor != 'sqlite':
+        return
+
+    fts_table = name_fts_table(model)
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(
+            'DROP TRIGGER IF EXISTS {}'.format(qn(f'{fts_table}_{suffix}'))
+        )
+    schema_editor.execute('DROP TABLE IF EXISTS {}'.format(qn(fts_table)))
@@ -1,7 +1,11 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError
 
 from .models import User, Passport
+from .hashing import hashing_pool, verify_password
+from .sqlite import write_queue
+from .metrics import password_hash_duration
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -22,7 +26,12 @@ class RegistrationSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'password', 'token',)
 
     def create(self, validated_data):
-        return User.objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+
+        return User.objects.create_user(
+            password_hash=hashing_pool.run(make_password, password),
+            **validated_data
+        )
 
 
 class LoginSerializer(serializers.Serializer):
@@ -32,6 +41,23 @@ class LoginSerializer(serializers.Serializer):
     token = serializers.CharField(max_length=255, read_only=True)
 
     def validate(self, data):
+        username, password = self.get_credentials(data)
+        user = self.get_user(username)
+
+        with password_hash_duration.time(operation='verify'):
+            valid, must_update = hashing_pool.run(
+                verify_password, password, user.password if user else None
+            )
+
+        if valid and must_update:
+            with password_hash_duration.time(operation='rehash'):
+                user.password = hashing_pool.run(make_password, password)
+            user.save(update_fields=['password'])
+
+        return self.get_login_data(user, valid)
+
+    @staticmethod
+    def get_credentials(data):
         username = data.get('username', None)
         password = data.get('password', None)
 
@@ -49,9 +75,17 @@ class LoginSerializer(serializers.Serializer):
                 code=400
             )
 
-        user = authenticate(username=username, password=password)
+        return username, password
 
-        if user is None:
+    @staticmethod
+    def get_user(username):
+        return User.objects.filter(username=username).first()
+
+    @staticmethod
+    def get_login_data(user, valid):
+        """ Проверка пароля выполняется отдельно, в пуле хэширования. """
+
+        if user is None or not valid:
             raise serializers.ValidationError(
                 'A user with this username and password was not found.',
                 code=404
@@ -113,11 +147,15 @@ class UserAdminSerializer(UserSerializer):
 class UsersSerializer(serializers.ModelSerializer):
 
     users = UserAdminSerializer(many=True)
-    amount = serializers.IntegerField()
+    amount = serializers.IntegerField(allow_null=True)
+    amount_mode = serializers.CharField()
 
     class Meta:
         model = User
-        fields = ('users', 'amount',)
+        fields = ('users', 'amount', 'amount_mode',)
+
+
+PASSPORT_EXISTS_MESSAGE = 'Passport with this passport data exists'
 
 
 class PassportCreateSerializer(serializers.ModelSerializer):
@@ -139,19 +177,18 @@ class PassportCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Passport
         fields = ('id', 'passport_series', 'passport_number', 'first_name', 'last_name',)
+        # Уникальность серии и номера проверяет индекс БД, а не отдельный запрос.
+        validators = []
 
     def create(self, validated_data):
-        if Passport.objects.get_by_passport_data(
-            passport_series=validated_data['passport_series'],
-            passport_number=validated_data['passport_number']
-        ):
+        try:
+            return write_queue.run(Passport.objects.create, **validated_data)
+        except IntegrityError:
             raise serializers.ValidationError(
-                detail='Passport with this passport data exists',
+                detail=PASSPORT_EXISTS_MESSAGE,
                 code=403
             )
 
-        return Passport.objects.create(**validated_data)
-
 
 class PassportSerializer(serializers.ModelSerializer):
     """ Ощуществляет сериализацию и десериализацию объектов Passport. """
@@ -170,6 +207,7 @@ class PassportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Passport
         fields = ('id', 'passport_series', 'passport_number', 'first_name', 'last_name')
+        validators = []
 
     def update(self, instance, validated_data):
         """ Выполняет обновление Passport. """
@@ -185,23 +223,21 @@ class PassportSerializer(serializers.ModelSerializer):
                 detail='Series and passport number must be transmitted at the same time',
                 code=400
             )
-        elif passport_series and passport_number and Passport.objects.get_by_passport_data(
-            passport_series=passport_series,
-            passport_number=passport_number,
-            excluded_id=instance.id
-        ) is not None:
-            raise serializers.ValidationError(
-                detail='Passport with this passport data exists',
-                code=403
-            )
 
-        validated_data['passport_series'] = passport_series
-        validated_data['passport_number'] = passport_number
+        if passport_series and passport_number:
+            validated_data['passport_series'] = passport_series
+            validated_data['passport_number'] = passport_number
 
         for key, value in validated_data.items():
             setattr(instance, key, value)
 
-        instance.save()
+        try:
+            write_queue.run(instance.save)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                detail=PASSPORT_EXISTS_MESSAGE,
+                code=403
+            )
 
         return instance
 
@@ -209,8 +245,20 @@ class PassportSerializer(serializers.ModelSerializer):
 class PassportsSerializer(serializers.ModelSerializer):
 
     passports = PassportSerializer(many=True)
-    amount = serializers.IntegerField()
+    amount = serializers.IntegerField(allow_null=True)
+    amount_mode = serializers.CharField()
+    next = serializers.CharField(allow_null=True)
+    previous = serializers.CharField(allow_null=True)
+
+    class Meta:
+        model = Passport
+        fields = ('passports', 'amount', 'amount_mode', 'next', 'previous',)
+
+
+class PassportSearchSerializer(serializers.ModelSerializer):
+
+    passports = PassportSerializer(many=True)
 
     class Meta:
         model = Passport
-        fields = ('passports', 'amount',)
+        fields = ('passports',)
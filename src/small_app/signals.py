@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .backends import remember_user_state
+from .caches import user_cache, passport_cache, search_cache
+from .models import User, Passport
+from .queries import install_query_recorder
+from .sqlite import configure_connection
+
+
+# Поля, от которых зависит проверка stateless-токенов.
+USER_STATE_FIELDS = frozenset(('token_version', 'is_active', 'is_staff'))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    user_cache.invalidate(instance.pk)
+    search_cache.bump('user')
+
+    # Состояния нужны только stateless-токенам; без них запись в кэш лишняя.
+    if not settings.JWT_STATELESS or created:
+        return
+
+    if update_fields is not None and not USER_STATE_FIELDS & update_fields:
+        return
+
+    remember_user_state(
+        instance.pk, instance.token_version, instance.is_active, instance.is_staff
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    search_cache.bump('user')
+
+    if settings.JWT_STATELESS:
+        remember_user_state(instance.pk)
+
+
+@receiver(post_save, sender=Passport)
+@receiver(post_delete, sender=Passport)
+def passport_changed(sender, instance, **kwargs):
+    passport_cache.invalidate(instance.pk)
+    search_cache.bump('passport')
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    configure_connection(connection)
+    install_query_recorder(connection)
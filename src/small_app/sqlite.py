@@ -0,0 +1,167 @@
+import queue
+import threading
+
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection as default_connection, transaction
+
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+def get_pragmas():
+    """ PRAGMA для новых соединений sqlite из настроек SQLITE_*. """
+
+    journal_mode = settings.SQLITE_JOURNAL_MODE.upper()
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+
+    if journal_mode not in JOURNAL_MODES:
+        raise ImproperlyConfigured(f'Unknown SQLITE_JOURNAL_MODE: {journal_mode}')
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ImproperlyConfigured(f'Unknown SQLITE_SYNCHRONOUS: {synchronous}')
+
+    return (
+        # busy_timeout первым: смена journal_mode сама может ждать блокировку.
+        ('busy_timeout', int(settings.SQLITE_BUSY_TIMEOUT)),
+        ('journal_mode', journal_mode),
+        ('synchronous', synchronous),
+        ('mmap_size', int(settings.SQLITE_MMAP_SIZE)),
+        ('cache_size', int(settings.SQLITE_CACHE_SIZE)),
+    )
+
+
+def get_transaction_mode():
+    """ Режим BEGIN для транзакций sqlite (small_app.db). """
+
+    mode = settings.SQLITE_TRANSACTION_MODE.upper()
+
+    if mode not in TRANSACTION_MODES:
+        raise ImproperlyConfigured(f'Unknown SQLITE_TRANSACTION_MODE: {mode}')
+
+    return mode
+
+
+def configure_connection(connection):
+    """
+    Применяет PRAGMA к новому соединению. WAL позволяет читать во время
+    записи, synchronous=NORMAL в режиме WAL не теряет целостность,
+    а busy_timeout заставляет писателей ждать вместо 'database is locked'.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in get_pragmas():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class WriteQueue:
+    """
+    Очередь записи в sqlite внутри процесса. Запись выполняет один поток,
+    задания из очереди собираются в пачку и коммитятся одной транзакцией,
+    каждое в своём savepoint, поэтому ошибка одного задания не откатывает
+    остальные. Между процессами запись по-прежнему разводит busy_timeout.
+
+    Если очередь выключена (SQLITE_WRITE_QUEUE) или вызывающий уже внутри
+    транзакции, задание выполняется сразу в текущем потоке.
+    """
+
+    def __init__(self, enabled=None, batch_size=None):
+        self.enabled = settings.SQLITE_WRITE_QUEUE if enabled is None else enabled
+        self.batch_size = batch_size or settings.SQLITE_WRITE_QUEUE_BATCH_SIZE
+
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.batches = 0
+        self.writes = 0
+        self.max_batch = 0
+        self._lock = threading.Lock()
+
+    def run(self, fn, *args, **kwargs):
+        """ Выполняет fn в очереди записи и возвращает её результат. """
+
+        if (
+            not self.enabled
+            or default_connection.in_atomic_block
+            or threading.current_thread() is self.thread
+        ):
+            with transaction.atomic():
+                return fn(*args, **kwargs)
+
+        return self.submit(fn, *args, **kwargs).result()
+
+    def submit(self, fn, *args, **kwargs):
+        self.start()
+
+        future = Future()
+        self.jobs.put((future, fn, args, kwargs))
+
+        return future
+
+    def start(self):
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.work,
+                    name='sqlite-writer',
+                    daemon=True
+                )
+                self.thread.start()
+
+    def work(self):
+        while True:
+            batch = [self.jobs.get()]
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            close_old_connections()
+            self.process(batch)
+
+    def process(self, batch):
+        """ Выполняет пачку заданий одной транзакцией. """
+
+        outcomes = []
+
+        try:
+            with transaction.atomic():
+                for future, fn, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+
+        # Результаты отдаются после коммита, чтобы вызывающий видел свои данные.
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'pending': self.jobs.qsize(),
+            'batches': self.batches,
+            'writes': self.writes,
+            'max_batch': self.max_batch,
+        }
+
+
+write_queue = WriteQueue()
@@ -1,18 +1,32 @@
 from django.urls import path
 
+from . import async_views
 from .views import (
     RegistrationAPIView, AuthenticationAPIView, UserRetrieveUpdateAPIView,
-    UsersRetrieveAPIView, UserAdminAPIView, PassportsApiView, PassportAPIView
+    UsersRetrieveAPIView, UserAdminAPIView, PassportsApiView, PassportAPIView,
+    PassportSearchAPIView, PassportImportAPIView, PassportExportAPIView,
+    CacheStatsAPIView, ProfilingSamplesAPIView
 )
 
 
 app_name = 'small_app'
 urlpatterns = [
-    path('users', RegistrationAPIView.as_view()),
-    path('login', AuthenticationAPIView.as_view()),
-    path('users/current', UserRetrieveUpdateAPIView.as_view()),
-    path('users_search', UsersRetrieveAPIView.as_view()),
-    path('users/<int:user_id>', UserAdminAPIView.as_view()),
-    path('passports', PassportsApiView.as_view()),
-    path('passports/<int:passport_id>', PassportAPIView.as_view())
+    path('users', RegistrationAPIView.as_view(), name='registration'),
+    path('login', AuthenticationAPIView.as_view(), name='login'),
+    path('users/current', UserRetrieveUpdateAPIView.as_view(), name='current_user'),
+    path('users_search', UsersRetrieveAPIView.as_view(), name='users_search'),
+    path('users/<int:user_id>', UserAdminAPIView.as_view(), name='user_admin'),
+    path('cache_stats', CacheStatsAPIView.as_view(), name='cache_stats'),
+    path('profiling/samples', ProfilingSamplesAPIView.as_view(), name='profiling_samples'),
+    path('passports', PassportsApiView.as_view(), name='passports'),
+    path('passports/search', PassportSearchAPIView.as_view(), name='passport_search'),
+    path('passports/import', PassportImportAPIView.as_view(), name='passport_import'),
+    path('passports/export', PassportExportAPIView.as_view(), name='passport_export'),
+    path('passports/<int:passport_id>', PassportAPIView.as_view(), name='passport'),
+    path('async/users', async_views.registration, name='async_registration'),
+    path('async/login', async_views.login, name='async_login'),
+    path('async/users/current', async_views.current_user, name='async_current_user'),
+    path('async/users/<int:user_id>', async_views.user_admin, name='async_user_admin'),
+    path('async/passports', async_views.passports, name='async_passports'),
+    path('async/passports/<int:passport_id>', async_views.passport, name='async_passport'),
 ]
\ No newline at end of file
@@ -1,23 +1,46 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
 from rest_framework import status, exceptions
 from rest_framework.generics import RetrieveUpdateAPIView, RetrieveAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.renderers import JSONRenderer
 
 from .models import User, Passport
 from .serializers import (
     RegistrationSerializer, LoginSerializer, UserSerializer,
     UsersSerializer, UserAdminSerializer, PassportCreateSerializer,
-    PassportSerializer, PassportsSerializer
+    PassportSerializer, PassportSearchSerializer
+)
+from .renders import UserJSONRenderer, FastJSONRenderer
+from .caches import user_cache, token_cache, passport_cache, search_cache
+from .hashing import hashing_pool
+from .sqlite import write_queue
+from .routers import use_replica
+from .profiling import sampler
+from .metrics import registry, scrape_allowed, CONTENT_TYPE
+from .fast_serializers import passports_page, passports_search_page, users_page
+from .pagination import (
+    NEXT, PREVIOUS, encode_cursor, get_position, get_page_size,
+    get_amount_mode, get_layout, get_fields
+)
+from .search import SUBSTRING, SEARCH_MODES, normalize_name
+from .imports import (
+    CSV, CONTENT_TYPES as IMPORT_CONTENT_TYPES, PassportImporter, read_ndjson, read_csv
+)
+from .exports import (
+    NDJSON, EXPORT_FORMATS, CONTENT_TYPES as EXPORT_CONTENT_TYPES,
+    PASSPORT_EXPORT_FIELDS, export_lines
 )
-from .renders import UserJSONRenderer
 
 
 class RegistrationAPIView(APIView):
     permission_classes = (AllowAny,)
     serializer_class = RegistrationSerializer
     renderer_classes = (UserJSONRenderer,)
+    query_budget = 3
 
     def post(self, request):
         user = request.data
@@ -32,6 +55,7 @@ class RegistrationAPIView(APIView):
 class AuthenticationAPIView(APIView):
     permission_classes = (AllowAny,)
     renderer_classes = (UserJSONRenderer,)
+    query_budget = 2
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -46,6 +70,7 @@ class AuthenticationAPIView(APIView):
 class UserRetrieveUpdateAPIView(RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticated,)
     renderer_classes = (UserJSONRenderer,)
+    query_budget = {'GET': 1, 'PUT': 4, 'PATCH': 4}
     serializer_class = UserSerializer
 
     def retrieve(self, request, *args, **kwargs):
@@ -67,8 +92,10 @@ class UserRetrieveUpdateAPIView(RetrieveUpdateAPIView):
 class UsersRetrieveAPIView(RetrieveAPIView):
     permission_classes = (IsAuthenticated, IsAdminUser)
     renderer_classes = (UserJSONRenderer,)
+    query_budget = 3
     serializer_class = UsersSerializer
 
+    @use_replica
     def retrieve(self, request, *args, **kwargs):
 
         filters = {
@@ -77,16 +104,35 @@ class UsersRetrieveAPIView(RetrieveAPIView):
             if key in ('username', 'email')
         }
 
-        users = User.objects.get_by_filters(filters)
-        serializer = self.serializer_class(users)
+        amount_mode = get_amount_mode(request.query_params)
+        layout = get_layout(request)
+        fields = get_fields(request.query_params, users_page.declared('users'))
+        page_serializer = users_page.select('users', fields)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def search():
+            users = User.objects.get_by_filters(
+                filters,
+                amount_mode=amount_mode,
+                values=page_serializer.sources('users')
+            )
+
+            return page_serializer.to_representation(users, layout)
+
+        data = search_cache.get_or_set('user', {
+            'filters': filters,
+            'amount_mode': amount_mode,
+            'layout': layout,
+            'fields': fields,
+        }, search)
+
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class UserAdminAPIView(APIView):
 
     permission_classes = (IsAuthenticated, IsAdminUser)
     renderer_classes = (UserJSONRenderer,)
+    query_budget = {'GET': 2, 'DELETE': 6}
     serializer_class = UserAdminSerializer
 
     def get(self, request, user_id):
@@ -94,7 +140,7 @@ class UserAdminAPIView(APIView):
         try:
             user = User.objects.get(id=user_id)
         except User.DoesNotExist as e:
-            raise exceptions.APIException(detail=e, code=404)
+            raise exceptions.NotFound(detail=str(e))
 
         serializer = self.serializer_class(user)
 
@@ -105,37 +151,143 @@ class UserAdminAPIView(APIView):
         try:
             user = User.objects.get(id=user_id)
         except User.DoesNotExist as e:
-            raise exceptions.APIException(detail=e, code=404)
+            raise exceptions.NotFound(detail=str(e))
 
-        user.delete()
+        write_queue.run(user.delete)
 
         return Response({}, status=status.HTTP_200_OK)
 
 
+class CacheStatsAPIView(APIView):
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    renderer_classes = (FastJSONRenderer,)
+    query_budget = 1
+
+    def get(self, request):
+        return Response({
+            'users': user_cache.stats(),
+            'tokens': token_cache.stats(),
+            'passports': passport_cache.stats(),
+            'search': search_cache.stats(),
+            'password_hashing': hashing_pool.stats(),
+            'write_queue': write_queue.stats(),
+            'sampler': sampler.stats()
+        }, status=status.HTTP_200_OK)
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Доступ по METRICS_TOKEN или
+    с адресов из METRICS_ALLOWED_IPS, см. scrape_allowed.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
+
+
+class ProfilingSamplesAPIView(APIView):
+    """
+    Накопленные семплирующим профилировщиком стеки в формате collapsed
+    stacks: flamegraph.pl samples.txt > flame.svg. DELETE обнуляет счётчики.
+    """
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    renderer_classes = (FastJSONRenderer,)
+    query_budget = 1
+
+    def get(self, request):
+        response = HttpResponse(sampler.folded(), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="samples.folded"'
+
+        return response
+
+    def delete(self, request):
+        sampler.reset()
+
+        return Response(sampler.stats(), status=status.HTTP_200_OK)
+
+
 class PassportsApiView(APIView):
 
     permission_classes = (IsAuthenticated,)
-    renderer_classes = (JSONRenderer,)
+    renderer_classes = (FastJSONRenderer,)
+    query_budget = {'GET': 3, 'POST': 2}
 
     @staticmethod
     def serialize_passport_filter(key: str):
         if key.__contains__('name'):
-            return f'{key}__icontains'
+            return f'{key}_search__name_contains'
 
         return key
 
-    def get(self, request, *args, **kwargs):
-
-        filters = {
-            self.serialize_passport_filter(key): value
-            for key, value in request.query_params.dict().items()
+    @staticmethod
+    def paginate_cursors(page: dict):
+        bounds = page['bounds']
+
+        next_cursor = None
+        if page['has_next'] and bounds:
+            next_cursor = encode_cursor(*bounds[-1], NEXT)
+
+        previous_cursor = None
+        if page['has_previous'] and bounds:
+            previous_cursor = encode_cursor(*bounds[0], PREVIOUS)
+
+        return next_cursor, previous_cursor
+
+    @classmethod
+    def passport_filters(cls, query_params):
+        # Имена нормализуются здесь же, чтобы одинаковые запросы давали
+        # одинаковый ключ кэша; lookup name_contains нормализует их так же.
+        return {
+            cls.serialize_passport_filter(key): normalize_name(value) if 'name' in key else value
+            for key, value in query_params.dict().items()
             if key in ('first_name', 'last_name', 'passport_series', 'passport_number')
         }
 
-        passports = Passport.objects.get_by_filters(filters)
-        serializer = PassportsSerializer(passports)
+    @classmethod
+    def search_page(cls, query_params, layout):
+        """ Страница списка из search_cache или БД; общая с async-представлением. """
+
+        filters = cls.passport_filters(query_params)
+
+        position, backwards = get_position(query_params)
+        page_size = get_page_size(query_params)
+        amount_mode = get_amount_mode(query_params)
+        fields = get_fields(query_params, passports_page.declared('passports'))
+        page_serializer = passports_page.select('passports', fields)
+
+        def search():
+            page = Passport.objects.get_by_filters(
+                filters,
+                page_size=page_size,
+                position=position,
+                backwards=backwards,
+                amount_mode=amount_mode,
+                values=page_serializer.sources('passports')
+            )
+            page['next'], page['previous'] = cls.paginate_cursors(page)
+
+            return page_serializer.to_representation(page, layout)
+
+        return search_cache.get_or_set('passport', {
+            'filters': filters,
+            'position': position,
+            'backwards': backwards,
+            'page_size': page_size,
+            'amount_mode': amount_mode,
+            'layout': layout,
+            'fields': fields,
+        }, search)
+
+    @use_replica
+    def get(self, request, *args, **kwargs):
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = self.search_page(request.query_params, get_layout(request))
+
+        return Response(data, status=status.HTTP_200_OK)
 
     def post(self, request):
 
@@ -146,26 +298,166 @@ class PassportsApiView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class PassportExportAPIView(APIView):
+    """
+    Потоковая выгрузка найденных паспортов в NDJSON или CSV. Строки читаются
+    серверным курсором без создания экземпляров модели, поэтому память
+    не растёт с размером выборки, а первый байт уходит сразу.
+    """
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    renderer_classes = (FastJSONRenderer,)
+
+    def get(self, request):
+
+        export_format = request.query_params.get('export_format', NDJSON)
+
+        if export_format not in EXPORT_FORMATS:
+            raise exceptions.ValidationError(
+                detail={'export_format': f'Must be one of: {", ".join(EXPORT_FORMATS)}'},
+                code=400
+            )
+
+        rows = Passport.objects.export_rows(
+            PassportsApiView.passport_filters(request.query_params),
+            fields=PASSPORT_EXPORT_FIELDS,
+            chunk_size=settings.PASSPORTS_EXPORT_CHUNK_SIZE
+        )
+
+        response = StreamingHttpResponse(
+            export_lines(export_format, PASSPORT_EXPORT_FIELDS, rows),
+            content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="passports.{export_format}"'
+
+        return response
+
+
+class PassportImportAPIView(APIView):
+    """
+    Массовый импорт паспортов. Тело запроса (NDJSON или CSV с заголовком)
+    читается построчно, не загружаясь в память целиком.
+    """
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    renderer_classes = (FastJSONRenderer,)
+
+    def post(self, request):
+
+        content_type = request.content_type.split(';')[0].strip()
+        import_format = request.query_params.get(
+            'import_format', IMPORT_CONTENT_TYPES.get(content_type)
+        )
+
+        if import_format not in IMPORT_CONTENT_TYPES.values():
+            raise exceptions.UnsupportedMediaType(content_type)
+
+        reader = read_csv if import_format == CSV else read_ndjson
+        batch_size = request.query_params.get('batch_size', None)
+        importer = PassportImporter(
+            batch_size=int(batch_size) if batch_size and batch_size.isdigit() else None
+        )
+        summary = importer.run(reader(request._request))
+
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class PassportSearchAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer,)
+    query_budget = 2
+    serializer_class = PassportSearchSerializer
+
+    @use_replica
+    def get(self, request):
+
+        query = request.query_params.get('q', '')
+        mode = request.query_params.get('mode', SUBSTRING)
+        fields = request.query_params.get('field', None)
+        fields = ('first_name', 'last_name') if fields is None else (fields,)
+
+        if not query:
+            raise exceptions.ValidationError(detail={'q': 'This field is required'}, code=400)
+        if mode not in SEARCH_MODES:
+            raise exceptions.ValidationError(
+                detail={'mode': f'Must be one of: {", ".join(SEARCH_MODES)}'},
+                code=400
+            )
+        if not set(fields) <= {'first_name', 'last_name'}:
+            raise exceptions.ValidationError(
+                detail={'field': 'Must be one of: first_name, last_name'},
+                code=400
+            )
+
+        passports = Passport.objects.search_by_name(
+            query,
+            fields=fields,
+            mode=mode,
+            limit=get_page_size(request.query_params),
+            values=passports_search_page.sources('passports')
+        )
+
+        return Response(
+            passports_search_page.to_representation(passports, get_layout(request)),
+            status=status.HTTP_200_OK
+        )
+
+
 class PassportAPIView(APIView):
     permission_classes = (IsAuthenticated,)
-    renderer_classes = (JSONRenderer,)
+    renderer_classes = (FastJSONRenderer,)
+    query_budget = {'GET': 2, 'PATCH': 3, 'DELETE': 3}
     serializer_class = PassportSerializer
 
+    @classmethod
+    def passport_data(cls, request, passport_id):
+        """
+        (ответ 304/412 или None, ETag, данные) из passport_cache или БД;
+        общая часть с async-представлением.
+        """
+        cached = passport_cache.get(passport_id)
+
+        if cached is None:
+            try:
+                passport = Passport.objects.get(id=passport_id)
+            except Passport.DoesNotExist as e:
+                raise exceptions.NotFound(detail=str(e))
+
+            etag, data = passport.etag, None
+        else:
+            etag, data = cached
+
+        # Клиент уже знает эту версию: 304 без сериализации.
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified, etag, None
+
+        if data is None:
+            data = cls.serializer_class(passport).data
+            passport_cache.set(passport_id, etag, data)
+
+        return None, etag, data
+
+    @staticmethod
+    def patch_response(response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+    @use_replica
     def get(self, request, passport_id):
-        try:
-            passport = Passport.objects.get(id=passport_id)
-        except Passport.DoesNotExist as e:
-            raise exceptions.APIException(detail=e, code=404)
+        not_modified, etag, data = self.passport_data(request, passport_id)
 
-        serializer = self.serializer_class(passport)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if not_modified is not None:
+            return not_modified
+
+        return self.patch_response(Response(data, status=status.HTTP_200_OK), etag)
 
     def patch(self, request, passport_id):
 
         try:
             passport = Passport.objects.get(id=passport_id)
         except Passport.DoesNotExist as e:
-            raise exceptions.APIException(detail=e, code=404)
+            raise exceptions.NotFound(detail=str(e))
 
         serializer_data = request.data
 
@@ -181,9 +473,9 @@ class PassportAPIView(APIView):
 
         try:
             passport = Passport.objects.get(id=passport_id)
-        except User.DoesNotExist as e:
-            raise exceptions.APIException(detail=e, code=404)
+        except Passport.DoesNotExist as e:
+            raise exceptions.NotFound(detail=str(e))
 
-        passport.delete()
+        write_queue.run(passport.delete)
 
         return Response({}, status=status.HTTP_200_OK)
@@ -14,21 +14,31 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from django.core.exceptions import ImproperlyConfigured
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Quick-start development settings - unsuitable for production
+# Профиль запуска: development (по умолчанию) или production.
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
+DJANGO_ENV = os.getenv('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-=jr%63whi_&dnblj40#mrpw-#5red_+_bvjf9%f#_jnbii&_dv'
+SECRET_KEY = os.getenv(
+    'SECRET_KEY',
+    'django-insecure-=jr%63whi_&dnblj40#mrpw-#5red_+_bvjf9%f#_jnbii&_dv'
+)
+
+if PRODUCTION and SECRET_KEY.startswith('django-insecure-'):
+    raise ImproperlyConfigured('SECRET_KEY must be set in production')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', str(not PRODUCTION)).lower() in ('true', '1')
 
-ALLOWED_HOSTS = ['0.0.0.0', '127.0.0.1']
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '0.0.0.0,127.0.0.1').split(',')
 
 
 # Application definition
@@ -45,12 +55,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'small_app.profiling.ProfilingMiddleware',
+    'small_app.metrics.MetricsMiddleware',
+    'small_app.queries.QueryStatsMiddleware',
+    'small_app.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'small_app.routers.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'test_dl.urls'
@@ -71,6 +86,18 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Статику отдаёт whitenoise прямо из воркеров, шаблоны кэшируются.
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'test_dl.wsgi.application'
 
 REST_FRAMEWORK = {
@@ -79,18 +106,188 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'small_app.backends.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'small_app.renders.FastJSONRenderer',
+    ),
 }
 
+# Учёт запросов к БД на HTTP-запрос: Server-Timing и бюджеты представлений.
+# QUERY_BUDGET_ACTION: log, raise (QueryBudgetExceeded) или off.
+QUERY_SERVER_TIMING = os.getenv('QUERY_SERVER_TIMING', str(not PRODUCTION)).lower() in ('true', '1')
+QUERY_BUDGET_ACTION = os.getenv('QUERY_BUDGET_ACTION', 'log')
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+
+# Метрики Prometheus на /metrics. С METRICS_DIR значения каждого процесса
+# пишутся в mmap-файл каталога и суммируются при выдаче (несколько
+# воркеров gunicorn); каталог очищается при старте gunicorn.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+# Доступ к /metrics: Bearer-токен для Prometheus (bearer_token в scrape_config)
+# или адреса клиентов. За reverse proxy REMOTE_ADDR - адрес прокси, поэтому
+# в production по умолчанию адресов нет и нужен METRICS_TOKEN.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = list(filter(None, os.getenv(
+    'METRICS_ALLOWED_IPS', '' if PRODUCTION else '127.0.0.1,::1'
+).split(',')))
+
+# Профилирование: cProfile запроса staff-пользователя по X-Profile или
+# ?profile= (text - отчёт вместо ответа, store - .prof в PROFILING_DIR)
+# и семплирование стеков в collapsed stacks для flame graph.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() in ('true', '1')
+PROFILING_DIR = os.getenv('PROFILING_DIR', '')
+PROFILING_TOP_FUNCTIONS = int(os.getenv('PROFILING_TOP_FUNCTIONS', 50))
+PROFILING_SAMPLER_ENABLED = os.getenv('PROFILING_SAMPLER_ENABLED', 'False').lower() in ('true', '1')
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', 10))
+PROFILING_MAX_STACKS = int(os.getenv('PROFILING_MAX_STACKS', 10000))
+
+# Сжатие ответов по Accept-Encoding: brotli (если установлен) или gzip
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() in ('true', '1')
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+# Ответы с JWT не сжимаются: сжатие секрета рядом с данными из запроса
+# открывает атаку BREACH. Имена URL через запятую (без namespace).
+COMPRESSION_EXCLUDED_URL_NAMES = [
+    name.strip() for name in os.getenv(
+        'COMPRESSION_EXCLUDED_URL_NAMES',
+        'registration,login,current_user,'
+        'async_registration,async_login,async_current_user'
+    ).split(',') if name.strip()
+]
+
+# Сериализация JSON-ответов: orjson или json (stdlib, если orjson не установлен)
+JSON_RENDERER_BACKEND = os.getenv('JSON_RENDERER_BACKEND', 'orjson')
+
+# Keyset-пагинация и подсчёт результатов поиска
+PASSPORTS_PAGE_SIZE = int(os.getenv('PASSPORTS_PAGE_SIZE', 50))
+PASSPORTS_MAX_PAGE_SIZE = int(os.getenv('PASSPORTS_MAX_PAGE_SIZE', 500))
+
+# Режим подсчёта amount в поиске по умолчанию: exact, estimated или none
+SEARCH_AMOUNT_MODE = os.getenv('SEARCH_AMOUNT_MODE', 'exact')
+SEARCH_AMOUNT_CACHE_TTL = int(os.getenv('SEARCH_AMOUNT_CACHE_TTL', 60))
+
+# Массовый импорт и выгрузка паспортов
+PASSPORTS_IMPORT_BATCH_SIZE = int(os.getenv('PASSPORTS_IMPORT_BATCH_SIZE', 1000))
+PASSPORTS_IMPORT_MAX_ERRORS = int(os.getenv('PASSPORTS_IMPORT_MAX_ERRORS', 1000))
+PASSPORTS_EXPORT_CHUNK_SIZE = int(os.getenv('PASSPORTS_EXPORT_CHUNK_SIZE', 2000))
+
+# Stateless JWT: пользователь собирается из claims токена без запроса к БД.
+# Отзыв токенов работает через кэш состояний пользователей, поэтому
+# JWT_REVOCATION_TTL не должен быть меньше времени жизни токена. Состояния
+# пишутся только при JWT_STATELESS=True: изменения, сделанные до включения
+# режима, не отзывают уже выданные токены.
+JWT_STATELESS = os.getenv('JWT_STATELESS', 'False').lower() in ('true', '1')
+JWT_REVOCATION_TTL = int(os.getenv('JWT_REVOCATION_TTL', 60 * 60 * 24))
+
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с BEGIN IMMEDIATE, см. small_app.db
+        'ENGINE': 'small_app.db',
         'NAME': BASE_DIR / 'local-db/db.sqlite3',
+        # Постоянные соединения вместо нового подключения на каждый запрос
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60 if PRODUCTION else 0)),
+    }
+}
+
+# Реплики для чтения: имена БД через запятую (для sqlite - пути к копиям
+# файла относительно BASE_DIR). Остальные параметры берутся из default.
+DATABASE_REPLICAS = []
+
+for number, name in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / name.strip(),
+        # В тестах реплики смотрят в тестовую default.
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['small_app.routers.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает с основной БД
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+# PRAGMA для соединений sqlite, применяются в small_app.sqlite.configure_connection.
+# cache_size в отрицательных значениях задаётся в KiB, busy_timeout - в мс.
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+# DEFERRED, IMMEDIATE или EXCLUSIVE: с IMMEDIATE одновременные транзакции
+# записи ждут друг друга по busy_timeout, а не падают с 'database is locked'.
+SQLITE_TRANSACTION_MODE = os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+
+# Очередь записи: один поток на процесс пишет пачками до BATCH_SIZE заданий
+SQLITE_WRITE_QUEUE = os.getenv('SQLITE_WRITE_QUEUE', 'False').lower() in ('true', '1')
+SQLITE_WRITE_QUEUE_BATCH_SIZE = int(os.getenv('SQLITE_WRITE_QUEUE_BATCH_SIZE', 64))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Состояния пользователей для отзыва stateless JWT читаются на каждом
+    # запросе, поэтому не из БД. Кэш обязан быть общим для всех воркеров и
+    # не вытеснять записи: в production Redis (maxmemory-policy noeviction),
+    # при разработке с одним процессом runserver хватает LocMem.
+    'jwt_state': {
+        'BACKEND': os.getenv(
+            'JWT_STATE_CACHE_BACKEND',
+            'django.core.cache.backends.redis.RedisCache' if PRODUCTION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'JWT_STATE_CACHE_LOCATION',
+            'redis://127.0.0.1:6379/1' if PRODUCTION else 'jwt_user_state'
+        ),
+    },
 }
 
+# Вытеснение по MAX_ENTRIES отключается для бэкендов, которые его делают сами.
+if CACHES['jwt_state']['BACKEND'].rsplit('.', 1)[0] in (
+    'django.core.cache.backends.db',
+    'django.core.cache.backends.locmem',
+    'django.core.cache.backends.filebased',
+):
+    CACHES['jwt_state']['OPTIONS'] = {'MAX_ENTRIES': 10 ** 9}
+
+JWT_STATE_CACHE = 'jwt_state'
+
+# Кэш пользователей для JWTAuthentication: LRU воркера поверх общего кэша
+USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'True').lower() in ('true', '1')
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+USER_CACHE_LOCAL_TTL = int(os.getenv('USER_CACHE_LOCAL_TTL', 5))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+# Общий уровень только с кэшем, общим для воркеров: в LocMem у каждого
+# процесса своя копия, и сброс из одного воркера до других не доходит.
+USER_CACHE_SHARED = os.getenv(
+    'USER_CACHE_SHARED',
+    str(CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache')
+).lower() in ('true', '1')
+
+# Кэш ответов PassportAPIView.get. Сбрасывается сигналами при изменении,
+# TTL ограничивает устаревание при чтении с отстающей реплики.
+PASSPORT_CACHE_ENABLED = os.getenv('PASSPORT_CACHE_ENABLED', 'True').lower() in ('true', '1')
+PASSPORT_CACHE_TTL = int(os.getenv('PASSPORT_CACHE_TTL', 60))
+
+# Кэш страниц поиска паспортов и пользователей, сбрасывается поколением модели
+SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'True').lower() in ('true', '1')
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 30))
+
+# Кэш проверенных JWT: запись живёт до exp токена, но не дольше TTL
+JWT_DECODE_CACHE_ENABLED = os.getenv('JWT_DECODE_CACHE_ENABLED', 'True').lower() in ('true', '1')
+JWT_DECODE_CACHE_SIZE = int(os.getenv('JWT_DECODE_CACHE_SIZE', 4096))
+JWT_DECODE_CACHE_TTL = int(os.getenv('JWT_DECODE_CACHE_TTL', 60 * 60 * 24))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -111,6 +308,37 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 AUTH_USER_MODEL = 'small_app.User'
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.0/topics/auth/passwords/
+# Выбранный хэшер используется для новых паролей; хэши других алгоритмов
+# и с другими параметрами перехэшируются при следующем входе.
+# Подобрать параметры помогает ./manage.py benchmark_hashers
+
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+# Выбранный PASSWORD_HASHER ставится первым, порядок остальных сохраняется.
+PASSWORD_HASHERS = sorted([
+    'small_app.hashers.TunedPBKDF2PasswordHasher',
+    'small_app.hashers.TunedArgon2PasswordHasher',
+    'small_app.hashers.TunedBCryptSHA256PasswordHasher',
+    'small_app.hashers.TunedScryptPasswordHasher',
+], key=lambda path: PASSWORD_HASHER.lower() not in path.lower())
+
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 320000))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 102400))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 8))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.getenv('PASSWORD_SCRYPT_BLOCK_SIZE', 8))
+PASSWORD_SCRYPT_PARALLELISM = int(os.getenv('PASSWORD_SCRYPT_PARALLELISM', 1))
+
+# Пул хэширования паролей при входе и регистрации: при переполнении
+# очереди или истечении ожидания клиент получает 503 с Retry-After.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 4 * PASSWORD_HASH_WORKERS))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 2))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -129,6 +357,9 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = Path(BASE_DIR, 'static')
 
+if PRODUCTION:
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
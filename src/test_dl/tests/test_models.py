@@ -1,5 +1,34 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
+import jwt
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from small_app.benchmarks import compare_reports
+from small_app.caches import token_cache, user_cache
+from small_app.fast_serializers import passports_page, users_page
+from small_app.management.commands.benchmark_endpoints import Command as BenchmarkCommand
+from small_app.metrics import MmapValues, Counter, Histogram, Metric, registry
 from small_app.models import User, Passport
+from small_app.serializers import PassportsSerializer, UsersSerializer
+from small_app.sqlite import WriteQueue
 from .test_data import USER_DATA, USER_UPDATE_DATA, PASSPORT_DATA, PASSPORT_UPDATE_DATA
 
 
@@ -78,3 +107,441 @@ class PassportTestCase(TestCase):
         response = Passport.objects.remove(passport_id=passport.id)
 
         self.assertEqual(response, True)
+
+    def test_passport_name_search(self):
+
+        Passport.objects.create(**PASSPORT_DATA)
+        Passport.objects.create(**{
+            **PASSPORT_UPDATE_DATA, 'first_name': 'Пётр', 'last_name': 'Иванченко'
+        })
+
+        for filters, amount in (
+            ({'last_name_search__name_contains': 'ИВАН'}, 2),
+            ({'last_name_search__name_contains': 'ченко'}, 1),
+            ({'first_name_search__name_contains': 'петр'}, 1),
+            ({'first_name_search__name_contains': 'ва'}, 1),
+            ({'last_name_search__name_startswith': 'иванов'}, 1),
+            ({'last_name_search__name_startswith': 'ванов'}, 0),
+        ):
+            self.assertEqual(Passport.objects.filter(**filters).count(), amount)
+
+        passports = Passport.objects.search_by_name('иванов')['passports']
+        self.assertEqual(
+            [passport.last_name for passport in passports],
+            [PASSPORT_DATA['last_name']]
+        )
+
+        passports = Passport.objects.search_by_name('иван', mode='prefix')['passports']
+        self.assertEqual(len(passports), 2)
+        self.assertEqual(passports[0].first_name, PASSPORT_DATA['first_name'])
+
+        Passport.objects.filter(last_name='Иванченко').delete()
+        self.assertEqual(
+            Passport.objects.filter(last_name_search__name_contains='ченко').count(), 0
+        )
+
+    def test_passport_data_unique(self):
+
+        Passport.objects.create(**PASSPORT_DATA)
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Passport.objects.create(**PASSPORT_DATA)
+
+        self.assertEqual(Passport.objects.count(), 1)
+
+    def test_passport_write_queue_batch(self):
+
+        batch = [
+            (Future(), Passport.objects.create, (), PASSPORT_DATA),
+            (Future(), Passport.objects.create, (), PASSPORT_DATA),
+            (Future(), Passport.objects.create, (), PASSPORT_UPDATE_DATA),
+        ]
+
+        WriteQueue(enabled=True).process(batch)
+
+        self.assertEqual(batch[0][0].result().passport_number, PASSPORT_DATA['passport_number'])
+        self.assertIsInstance(batch[1][0].exception(), IntegrityError)
+        self.assertEqual(Passport.objects.count(), 2)
+
+
+@override_settings(USER_CACHE_ENABLED=True, USER_CACHE_SHARED=True)
+class UserCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.local.clear()
+
+        self.user = User.objects.create_user(**USER_DATA)
+
+    def test_password_hash_is_not_cached(self):
+
+        user = user_cache.get(self.user.id)
+        values = user_cache.local.get(user_cache.key(self.user.id))
+
+        self.assertNotIn('password', values['fields'])
+        self.assertEqual(user.username, USER_DATA['username'])
+
+        # Хэш загружается из БД только при обращении.
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password(USER_DATA['password']))
+
+    def test_invalidate_during_load(self):
+
+        fetch = user_cache.fetch
+
+        def fetch_then_update(user_id):
+            values = fetch(user_id)
+
+            # Изменение из другого запроса между чтением БД и записью в кэш.
+            User.objects.filter(pk=user_id).update(is_active=False)
+            user_cache.invalidate(user_id)
+
+            return values
+
+        with mock.patch.object(user_cache, 'fetch', fetch_then_update):
+            self.assertTrue(user_cache.get(self.user.id).is_active)
+
+        self.assertIsNone(user_cache.local.get(user_cache.key(self.user.id)))
+        self.assertFalse(user_cache.get(self.user.id).is_active)
+
+        user_cache.local.clear()
+
+        # Из общего кэша устаревшая запись тоже не читается.
+        with self.assertNumQueries(0):
+            self.assertFalse(user_cache.get(self.user.id).is_active)
+
+
+@override_settings(JWT_DECODE_CACHE_ENABLED=True, JWT_DECODE_CACHE_TTL=3600)
+class TokenCacheTestCase(TestCase):
+    def setUp(self):
+        token_cache.local.clear()
+
+    @staticmethod
+    def token(exp):
+        return jwt.encode({'id': 1, 'exp': exp}, settings.SECRET_KEY).decode('utf-8')
+
+    def test_ttl_is_capped_by_exp(self):
+
+        token = self.token(int(time.time()) + 30)
+        token_cache.decode(token)
+
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        _, expires_at = token_cache.local._data[key]
+
+        self.assertLessEqual(expires_at - time.monotonic(), 30)
+
+        # Токен без exp живёт JWT_DECODE_CACHE_TTL.
+        token = jwt.encode({'id': 1}, settings.SECRET_KEY).decode('utf-8')
+        token_cache.decode(token)
+
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        _, expires_at = token_cache.local._data[key]
+
+        self.assertGreater(expires_at - time.monotonic(), 30)
+
+    def test_expired_token_is_rejected_from_cache(self):
+
+        now = time.time()
+        token = self.token(int(now) + 30)
+
+        self.assertEqual(token_cache.decode(token)['id'], 1)
+
+        # Часы ушли за exp, а запись в LRU ещё жива.
+        with mock.patch('small_app.caches.time.time', return_value=now + 60):
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                token_cache.decode(token)
+
+
+class ProductionSettingsTestCase(SimpleTestCase):
+    """ Смоук-тест профиля DJANGO_ENV=production в отдельном процессе. """
+
+    script = (
+        'import json, django\n'
+        'django.setup()\n'
+        'from django.conf import settings\n'
+        'print(json.dumps({\n'
+        '    "debug": settings.DEBUG,\n'
+        '    "whitenoise": "whitenoise.middleware.WhiteNoiseMiddleware" in settings.MIDDLEWARE,\n'
+        '    "conn_max_age": settings.DATABASES["default"]["CONN_MAX_AGE"],\n'
+        '    "jwt_state": settings.CACHES["jwt_state"]["BACKEND"],\n'
+        '    "metrics_allowed_ips": settings.METRICS_ALLOWED_IPS,\n'
+        '}))\n'
+    )
+
+    def run_production(self, *args, **env):
+        return subprocess.run(
+            [sys.executable, *args],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_ENV': 'production', 'DJANGO_SETTINGS_MODULE': 'test_dl.settings', **env},
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+
+    def test_production_profile(self):
+
+        result = self.run_production('-c', self.script, SECRET_KEY='production-smoke-test')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), {
+            'debug': False,
+            'whitenoise': True,
+            'conn_max_age': 60,
+            'jwt_state': 'django.core.cache.backends.redis.RedisCache',
+            'metrics_allowed_ips': [],
+        })
+
+        result = self.run_production(
+            'manage.py', 'check', '--deploy', '--fail-level', 'ERROR',
+            SECRET_KEY='production-smoke-test'
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    @unittest.skipUnless(importlib.util.find_spec('whitenoise'), 'deploy/requirements.txt is not installed')
+    def test_production_wsgi_application(self):
+
+        result = self.run_production(
+            '-c', 'from test_dl.wsgi import application',
+            SECRET_KEY='production-smoke-test'
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_production_requires_secret_key(self):
+
+        env = {key: value for key, value in os.environ.items() if key != 'SECRET_KEY'}
+
+        with mock.patch.dict(os.environ, env, clear=True):
+            result = self.run_production('-c', self.script)
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('SECRET_KEY must be set in production', result.stderr)
+
+
+class SQLiteTestCase(TestCase):
+    def test_connection_pragmas(self):
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT)
+
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class SQLiteConcurrencyTestCase(SimpleTestCase):
+    """
+    Запись в файл sqlite из нескольких потоков, у каждого своё соединение,
+    как у воркеров gunicorn. Очередь записи выключена.
+    """
+
+    alias = 'concurrent'
+    threads = 8
+    rounds = 20
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        connections.settings[self.alias] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+        }
+        self.addCleanup(connections.settings.pop, self.alias)
+        self.addCleanup(connections[self.alias].close)
+
+        with connections[self.alias].schema_editor() as editor:
+            editor.create_model(Passport)
+
+        self.passports = Passport.objects.using(self.alias).bulk_create(
+            Passport(**{**PASSPORT_DATA, 'passport_number': 100000 + number})
+            for number in range(self.threads + 1)
+        )
+
+    def write_concurrently(self, job):
+        errors = []
+
+        def worker(number):
+            try:
+                job(number)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[self.alias].close()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return errors
+
+    @override_settings(SQLITE_WRITE_QUEUE=False)
+    def test_concurrent_patch_and_delete(self):
+
+        patched = self.passports[-1]
+
+        def patch_then_delete(number):
+            # Чтение и запись в одной транзакции, как в PATCH и в
+            # DatabaseCache.set: с BEGIN DEFERRED это 'database is locked'.
+            for round in range(self.rounds):
+                with transaction.atomic(using=self.alias):
+                    passport = Passport.objects.using(self.alias).get(pk=patched.pk)
+                    passport.first_name = f'{number}-{round}'
+                    passport.save(using=self.alias)
+
+            with transaction.atomic(using=self.alias):
+                Passport.objects.using(self.alias).get(pk=self.passports[number].pk).delete(using=self.alias)
+
+        self.assertEqual(self.write_concurrently(patch_then_delete), [])
+        self.assertEqual(
+            list(Passport.objects.using(self.alias).values_list('pk', flat=True)), [patched.pk]
+        )
+
+
+class FastSerializersTestCase(TestCase):
+    def test_fast_serializers_match_drf(self):
+
+        Passport.objects.create(**PASSPORT_DATA)
+        Passport.objects.create(**PASSPORT_UPDATE_DATA)
+        User.objects.create_user(**USER_DATA)
+
+        for page, serializer_class, manager, name in (
+            (passports_page, PassportsSerializer, Passport.objects, 'passports'),
+            (users_page, UsersSerializer, User.objects, 'users'),
+        ):
+            fast = manager.get_by_filters({}, values=page.sources(name))
+            fast.update(next=None, previous=None)
+            full = manager.get_by_filters({})
+            full.update(next=None, previous=None)
+
+            self.assertEqual(
+                json.dumps(page.to_representation(fast)),
+                json.dumps(serializer_class(full).data)
+            )
+
+
+class MetricsTestCase(TestCase):
+    def test_mmap_values_are_summed_across_processes(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            first = MmapValues(os.path.join(directory, '1.db'))
+            second = MmapValues(os.path.join(directory, '2.db'))
+
+            key = Metric.key('http_requests_total', [['view', 'passports']])
+            first.inc(key, 2)
+            second.inc(key, 3)
+
+            # Файл растёт, когда записи не помещаются в начальный размер.
+            for number in range(2000):
+                first.inc(Metric.key('filler', [['number', str(number)]]), 1)
+
+            self.assertEqual(MmapValues.read(first.path)[key], 2)
+            self.assertEqual(MmapValues(first.path).items()[key], 2)
+
+            with override_settings(METRICS_DIR=directory):
+                self.assertEqual(registry.collect()[key], 5)
+
+    def test_histogram_exposition(self):
+
+        metrics = registry.metrics[:]
+        try:
+            histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(.1, 1.0))
+            counter = Counter('test_total', 'Test.', ('view',))
+
+            with override_settings(METRICS_DIR=''):
+                histogram.observe(.05, view='a"b')
+                histogram.observe(.5, view='a"b')
+                counter.inc(view='a"b')
+
+                text = registry.exposition()
+        finally:
+            registry.metrics[:] = metrics
+
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="0.1"} 1.0', text)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="1.0"} 2.0', text)
+        self.assertIn('test_seconds_bucket{view="a\\"b",le="+Inf"} 2.0', text)
+        self.assertIn('test_seconds_count{view="a\\"b"} 2.0', text)
+        self.assertIn('test_total{view="a\\"b"} 1.0', text)
+
+
+class ImportPassportsCommandTestCase(TestCase):
+    def import_passports(self, *args):
+        stdout = StringIO()
+        call_command('import_passports', *args, stdout=stdout)
+
+        return json.loads(stdout.getvalue())
+
+    def test_invalid_utf8_rows_are_skipped(self):
+
+        ndjson = b'\n'.join([
+            json.dumps({**PASSPORT_DATA, 'passport_number': 111111}).encode('utf-8'),
+            b'{"first_name": "\xff\xfe"}',
+            json.dumps({**PASSPORT_DATA, 'passport_number': 111112}).encode('utf-8'),
+        ])
+        csv = (
+            'first_name,last_name,passport_series,passport_number\r\n'.encode('utf-8')
+            + b'\xc3\x28,Petrov,2222,333333\r\n'
+            + 'Анна,Петрова,2222,333334\r\n'.encode('utf-8')
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, data in (('passports.ndjson', ndjson), ('passports.csv', csv)):
+                with open(os.path.join(directory, name), 'wb') as stream:
+                    stream.write(data)
+
+            summary = self.import_passports(os.path.join(directory, 'passports.ndjson'))
+            self.assertEqual(summary['created'], 2)
+            self.assertEqual(summary['errors'], [{'row': 2, 'errors': {'error': ['Invalid UTF-8']}}])
+
+            summary = self.import_passports(os.path.join(directory, 'passports.csv'))
+            self.assertEqual(summary['created'], 1)
+            self.assertEqual([error['row'] for error in summary['errors']], [2])
+
+        ndjson = ndjson.replace(b'11111', b'22222')
+        with mock.patch('sys.stdin', io.TextIOWrapper(io.BytesIO(ndjson), encoding='utf-8')):
+            summary = self.import_passports('-', '--format', 'ndjson')
+
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['failed'], 1)
+
+
+class BenchmarkToolsTestCase(TestCase):
+    def test_seed_data(self):
+
+        for _ in range(2):
+            call_command('seed_data', users=5, passports=20, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='seed_').count(), 6)
+        self.assertTrue(User.objects.get(username='seed_admin').is_staff)
+        self.assertTrue(User.objects.get(username='seed_3').check_password('seed-password'))
+        self.assertEqual(Passport.objects.count(), 20)
+        self.assertEqual(Passport.objects.filter(first_name_search='').count(), 0)
+
+    def test_compare_reports(self):
+
+        def report(p95, throughput):
+            return {'endpoints': {'login': {
+                'throughput_rps': throughput, 'latency_ms': {'p95': p95}
+            }}}
+
+        comparison = compare_reports(report(10.0, 100.0), report(11.0, 95.0), 20)
+        self.assertEqual(comparison['login']['p95_change_percent'], 10.0)
+        self.assertFalse(comparison['login']['regression'])
+
+        comparison = compare_reports(report(10.0, 100.0), report(10.0, 70.0), 20)
+        self.assertTrue(comparison['login']['regression'])
+
+        # Нулевой p95 в прошлом отчёте: изменение не считается.
+        comparison = compare_reports(report(0.0, 100.0), report(10.0, 100.0), 20)
+        self.assertIsNone(comparison['login']['p95_change_percent'])
+
+        current = report(10.0, 100.0)
+        current['endpoints']['login'].update({
+            'errors': 0, 'latency_ms': {'p50': 5.0, 'p95': 10.0, 'p99': 12.0}
+        })
+        current['comparison'] = comparison
+
+        stdout = StringIO()
+        BenchmarkCommand(stdout=stdout).print_report(current)
+        self.assertIn('p95 n/a', stdout.getvalue())
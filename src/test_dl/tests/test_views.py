@@ -1,9 +1,27 @@
+import gzip
+import os
 import string
 import random
 import json
-
-from django.test import TestCase
+import tempfile
+import threading
+
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from small_app.backends import state_cache, user_state_key
+from small_app.caches import passport_cache, user_cache
+from small_app.hashing import hashing_pool
 from small_app.models import User, Passport
+from small_app.queries import QueryBudgetExceeded
+from small_app.profiling import sampler
+from small_app.views import PassportAPIView
+from small_app.renders import get_dumps
+from small_app.routers import PIN_COOKIE, ReplicaRouter, read_from_replica
 from .test_data import (
     SUPERUSER_DATA, USER_DATA, PASSPORT_DATA,
     PASSPORT_UPDATE_DATA, BASE_URL
@@ -16,6 +34,30 @@ def get_random_string(length):
 
 
 class UserViewsTestCase(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплики из DATABASE_REPLICAS в тестах работают через соединение
+        # default, иначе они не видят данные из транзакции теста.
+        for alias in settings.DATABASE_REPLICAS:
+            connections[alias] = connections['default']
+
+        super().setUpClass()
+
+    def setUp(self):
+        # id пользователей повторяются между тестами, а кэш состояний - в памяти.
+        state_cache().clear()
+
+    def assertRequestQueries(self, response, expected):
+        """ Число запросов к БД, которое QueryStatsMiddleware насчитал для ответа. """
+
+        stats = response.query_stats
+        self.assertEqual(
+            stats.count, expected,
+            f'{stats.count} queries executed, {expected} expected:\n' + '\n'.join(stats.statements)
+        )
+
     def test_unauthorized_user(self):
         response = self.client.get(f'{BASE_URL}/api/users/current')
         self.assertEqual(response.status_code, 403)
@@ -327,3 +369,1315 @@ class UserViewsTestCase(TestCase):
         )
 
         self.assertEqual(response.status_code, 200)
+
+    def test_get_passports_pagination(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        for number in range(5):
+            Passport.objects.create(
+                **{**PASSPORT_DATA, 'passport_number': 100000 + number}
+            )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports?page_size=2',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['passports']), 2)
+        self.assertEqual(response.data['amount'], 5)
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+
+        seen = [passport['id'] for passport in response.data['passports']]
+        next_cursor = response.data['next']
+        while next_cursor is not None:
+            response = self.client.get(
+                f'{BASE_URL}/api/passports?page_size=2&cursor={next_cursor}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+            seen += [passport['id'] for passport in response.data['passports']]
+            next_cursor = response.data['next']
+
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 5)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports?page_size=2&cursor={response.data["previous"]}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(
+            [passport['id'] for passport in response.data['passports']],
+            seen[2:4]
+        )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports?cursor=broken',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_users_amount_modes(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        for amount_mode, amount in (('exact', 2), ('estimated', 2), ('none', None)):
+            response = self.client.get(
+                f'{BASE_URL}/api/users_search?amount={amount_mode}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['amount'], amount)
+            self.assertEqual(response.data['amount_mode'], amount_mode)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users_search?amount=approximate',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_passports(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+        passport.save()
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/search',
+            {'q': 'иван', 'mode': 'prefix', 'field': 'last_name'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['passports'][0]['id'], passport.id)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'last_name': 'ИВАНОВ'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], 1)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/search',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_passport_name_only(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+        passport.save()
+
+        response = self.client.patch(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            content_type='application/json',
+            data={'first_name': PASSPORT_UPDATE_DATA['first_name']},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], PASSPORT_UPDATE_DATA['first_name'])
+        self.assertEqual(response.data['passport_series'], PASSPORT_DATA['passport_series'])
+        self.assertEqual(response.data['passport_number'], PASSPORT_DATA['passport_number'])
+
+    def test_import_passports(self):
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        Passport.objects.create(**PASSPORT_DATA)
+
+        rows = [
+            PASSPORT_DATA,
+            PASSPORT_UPDATE_DATA,
+            PASSPORT_UPDATE_DATA,
+            {**PASSPORT_DATA, 'passport_number': 12},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n{broken\n'
+
+        response = self.client.post(
+            f'{BASE_URL}/api/passports/import?batch_size=2',
+            content_type='application/x-ndjson',
+            data=body,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['duplicates'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5])
+        self.assertEqual(
+            Passport.objects.filter(last_name_search__name_contains='семенов').count(), 1
+        )
+
+        body = 'first_name,last_name,passport_series,passport_number\nАнна,Петрова,1111,222222\n'
+        response = self.client.post(
+            f'{BASE_URL}/api/passports/import',
+            content_type='text/csv',
+            data=body,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Passport.objects.count(), 3)
+
+        # Строка не в UTF-8 попадает в отчёт, остальные импортируются.
+        body = b'\n'.join([
+            json.dumps({**PASSPORT_DATA, 'passport_number': 111111}).encode('utf-8'),
+            b'{"first_name": "\xff\xfe"}',
+            json.dumps({**PASSPORT_DATA, 'passport_number': 111112}).encode('utf-8'),
+        ])
+        response = self.client.post(
+            f'{BASE_URL}/api/passports/import',
+            content_type='application/x-ndjson',
+            data=body,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'errors': {'error': ['Invalid UTF-8']}}])
+
+        body = (
+            'first_name,last_name,passport_series,passport_number\n'.encode('utf-8')
+            + b'\xc3\x28,Petrov,2222,333333\n'
+            + 'Анна,Петрова,2222,333334\n'.encode('utf-8')
+        )
+        response = self.client.post(
+            f'{BASE_URL}/api/passports/import',
+            content_type='text/csv',
+            data=body,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+
+    def test_export_passports(self):
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+        Passport.objects.create(**PASSPORT_UPDATE_DATA)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/export',
+            {'last_name': 'иванов'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).decode('utf-8').splitlines()
+        ]
+        self.assertEqual(rows, [{'id': passport.id, **PASSPORT_DATA}])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/export',
+            {'export_format': 'csv'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'id,passport_series,passport_number,first_name,last_name')
+        self.assertEqual(len(lines), 3)
+
+    @override_settings(JWT_STATELESS=True)
+    def test_stateless_token_auth(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+        passport.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f'{BASE_URL}/api/passports/{passport.id}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], USER_DATA['email'])
+
+        user.set_password(get_random_string(10))
+        user.save()
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(JWT_STATELESS=True, PROFILING_ENABLED=True)
+    def test_async_stateless_token_auth(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/async/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).json()['token']
+
+        admin_token = self.client.post(
+            f'{BASE_URL}/api/async/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).json()['token']
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], USER_DATA['email'])
+
+        # Профилирование проверяет staff через aauthenticate.
+        response = self.client.get(
+            f'{BASE_URL}/api/async/passports?profile=text',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('function calls', response.content.decode())
+
+        user.set_password(get_random_string(10))
+        user.save()
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_state_is_written_only_when_stateless(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.is_staff = True
+        user.save()
+
+        self.assertIsNone(state_cache().get(user_state_key(user.id)))
+
+        with override_settings(JWT_STATELESS=True):
+            user.save()
+
+        self.assertEqual(state_cache().get(user_state_key(user.id)), (user.token_version, True, True))
+
+    @override_settings(JWT_STATELESS=True)
+    def test_stateless_token_staff_demotion(self):
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        admin_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        response = self.client.get(
+            f'{BASE_URL}/api/cache_stats',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        superuser.is_staff = False
+        superuser.save()
+
+        # Вытеснение из общего кэша (default) не теряет состояние: оно
+        # хранится в отдельном кэше jwt_state.
+        cache.clear()
+
+        response = self.client.get(
+            f'{BASE_URL}/api/cache_stats',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_cache(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        admin_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+        passport.save()
+
+        self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        # Пользователь и ответ с паспортом берутся из кэшей.
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f'{BASE_URL}/api/passports/{passport.id}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/cache_stats',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data['users']['local']['hits'], 0)
+        self.assertGreater(response.data['tokens']['local']['hits'], 0)
+
+        response = self.client.delete(
+            f'{BASE_URL}/api/users/{user.id}',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_login_rehashes_password(self):
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user(**USER_DATA)
+            user.save()
+
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        response = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        user.refresh_from_db()
+        self.assertFalse(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(user.token_version, 0)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_registration_and_login(self):
+
+        response = self.client.post(
+            f'{BASE_URL}/api/async/users',
+            content_type='application/json',
+            data=json.dumps(USER_DATA)
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['username'], USER_DATA['username'])
+        self.assertIsNotNone(response.json()['token'])
+
+        response = self.client.post(
+            f'{BASE_URL}/api/async/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], USER_DATA['email'])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {response.json()["token"]}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            f'{BASE_URL}/api/async/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': get_random_string(10)
+            })
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.json())
+
+    def test_login_hashing_pool_saturated(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        for _ in range(hashing_pool.workers):
+            hashing_pool.slots.acquire()
+        queue_size, hashing_pool.queue_size = hashing_pool.queue_size, 0
+
+        try:
+            response = self.client.post(
+                f'{BASE_URL}/api/login',
+                content_type='application/json',
+                data=json.dumps({
+                    'username': USER_DATA['username'],
+                    'password': USER_DATA['password']
+                })
+            )
+        finally:
+            hashing_pool.queue_size = queue_size
+            for _ in range(hashing_pool.workers):
+                hashing_pool.slots.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNotNone(response['Retry-After'])
+
+    def test_async_passport_views(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        response = self.client.get(f'{BASE_URL}/api/async/passports')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post(
+            f'{BASE_URL}/api/async/passports',
+            content_type='application/json',
+            data=PASSPORT_DATA,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        passport_id = response.json()['id']
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/passports',
+            {'last_name': PASSPORT_DATA['last_name']},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['amount'], 1)
+        self.assertEqual(response.json()['passports'][0]['id'], passport_id)
+
+        # Страница и паспорт берутся из тех же кэшей, что и в sync-представлениях.
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f'{BASE_URL}/api/async/passports',
+                {'last_name': PASSPORT_DATA['last_name']},
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+        self.assertEqual(response.json()['passports'][0]['id'], passport_id)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/passports/{passport_id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['first_name'], PASSPORT_DATA['first_name'])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                f'{BASE_URL}/api/async/passports/{passport_id}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+
+        self.assertEqual(not_modified.status_code, 304)
+
+        response = self.client.patch(
+            f'{BASE_URL}/api/async/passports/{passport_id}',
+            content_type='application/json',
+            data=PASSPORT_UPDATE_DATA,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['last_name'], PASSPORT_UPDATE_DATA['last_name'])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/users/current',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], USER_DATA['email'])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/async/users/{user.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.delete(
+            f'{BASE_URL}/api/async/passports/{passport_id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Passport.objects.filter(id=passport_id).exists())
+
+    @override_settings(DATABASE_REPLICAS=['replica_test'])
+    def test_replica_routing(self):
+
+        # Отдельный псевдоним реплики; соединение общее с default, иначе
+        # реплика не видит данные из транзакции теста.
+        connections.settings['replica_test'] = {
+            **connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}
+        }
+        connections['replica_test'] = connections['default']
+        self.addCleanup(connections.settings.pop, 'replica_test')
+        self.addCleanup(delattr, connections._connections, 'replica_test')
+
+        cache.clear()
+        router = ReplicaRouter()
+
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Passport), 'replica_test')
+        self.assertIsNone(router.db_for_read(Passport))
+        self.assertEqual(router.db_for_write(Passport), 'default')
+        self.assertFalse(router.allow_migrate('replica_test', 'small_app'))
+        self.assertIsNone(router.allow_migrate('default', 'small_app'))
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        db_for_read = ReplicaRouter.db_for_read
+        reads = []
+
+        def record_read(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            if model is Passport:
+                reads.append(alias or 'default')
+            return alias
+
+        with patch.object(ReplicaRouter, 'db_for_read', record_read):
+            response = self.client.get(
+                f'{BASE_URL}/api/passports',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(reads), {'replica_test'})
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+
+            response = self.client.post(
+                f'{BASE_URL}/api/passports',
+                content_type='application/json',
+                data=PASSPORT_DATA,
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 201)
+            self.assertIn(PIN_COOKIE, response.cookies)
+            passport_id = response.data['id']
+
+            # Закреплённый клиент читает свою запись с основной БД.
+            reads.clear()
+            response = self.client.get(
+                f'{BASE_URL}/api/passports/{passport_id}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(reads, ['default'])
+
+            # Cookie другого пользователя не закрепляет.
+            self.client.cookies[PIN_COOKIE] = 'forged'
+            passport_cache.invalidate(passport_id)
+            reads.clear()
+            response = self.client.get(
+                f'{BASE_URL}/api/passports/{passport_id}',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(reads, ['replica_test'])
+
+    def test_get_passport_etag(self):
+
+        cache.clear()
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        passport = Passport.objects.create(**PASSPORT_DATA)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], passport.etag)
+        etag = response['ETag']
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.client.patch(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            content_type='application/json',
+            data={'last_name': PASSPORT_UPDATE_DATA['last_name']},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['last_name'], PASSPORT_UPDATE_DATA['last_name'])
+
+        self.client.delete(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.patch(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            content_type='application/json',
+            data={'last_name': PASSPORT_UPDATE_DATA['last_name']},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.delete(
+            f'{BASE_URL}/api/passports/{passport.id}',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_cache(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        Passport.objects.create(**PASSPORT_DATA)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'last_name': 'иван'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], 1)
+
+        # Тот же поиск в другом регистре берётся из кэша без запросов.
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f'{BASE_URL}/api/passports',
+                {'last_name': 'ИВАН'},
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], 1)
+
+        self.client.post(
+            f'{BASE_URL}/api/passports',
+            content_type='application/json',
+            data={**PASSPORT_UPDATE_DATA, 'last_name': 'Иванченко'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'last_name': 'иван'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], 2)
+
+    def test_json_renderer_backends(self):
+
+        data = {'passports': [PASSPORT_DATA], 'token': b'token', 'amount': None}
+
+        self.assertEqual(get_dumps('orjson')(data), get_dumps('json')(data))
+
+        response = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({'username': USER_DATA['username']})
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['errors'])
+
+    def test_passports_columnar_and_compressed(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        Passport.objects.bulk_create([
+            Passport(**{**PASSPORT_DATA, 'passport_number': 100000 + number})
+            for number in range(100)
+        ])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'layout': 'columnar', 'page_size': 100},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        passports = response.json()['passports']
+        self.assertEqual(
+            passports['fields'],
+            ['id', 'passport_series', 'passport_number', 'first_name', 'last_name']
+        )
+        self.assertEqual(len(passports['rows']), 100)
+        self.assertEqual(passports['rows'][0][3], PASSPORT_DATA['first_name'])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'page_size': 100},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+            HTTP_ACCEPT='application/json; layout=columnar',
+            HTTP_ACCEPT_ENCODING='gzip'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content))['passports']['fields'],
+            passports['fields']
+        )
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            {'layout': 'rows'},
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_token_responses_not_compressed(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        with override_settings(COMPRESSION_MIN_SIZE=0):
+            for url in ('login', 'async/login'):
+                response = self.client.post(
+                    f'{BASE_URL}/api/{url}',
+                    content_type='application/json',
+                    data=json.dumps({
+                        'username': USER_DATA['username'],
+                        'password': USER_DATA['password']
+                    }),
+                    HTTP_ACCEPT_ENCODING='gzip'
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+                auth_token = response.json()['token']
+
+            for url in ('users/current', 'async/users/current'):
+                response = self.client.get(
+                    f'{BASE_URL}/api/{url}',
+                    HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+                    HTTP_ACCEPT_ENCODING='gzip'
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+
+            response = self.client.get(
+                f'{BASE_URL}/api/passports',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}',
+                HTTP_ACCEPT_ENCODING='gzip'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_sparse_fieldsets(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        admin_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        Passport.objects.create(**PASSPORT_DATA)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'{BASE_URL}/api/passports',
+                {'fields': 'last_name,id', 'amount': 'none'},
+                HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['passports'],
+            [{'id': Passport.objects.get().id, 'last_name': PASSPORT_DATA['last_name']}]
+        )
+        self.assertNotIn('"first_name"', queries.captured_queries[-1]['sql'])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users_search',
+            {'fields': 'username', 'username': USER_DATA['username']},
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['users'], [{'username': USER_DATA['username']}])
+
+        response = self.client.get(
+            f'{BASE_URL}/api/users_search',
+            {'fields': 'username,password'},
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json()['errors'])
+
+    def test_query_budgets(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        user_cache.local.clear()
+        cache.clear()
+
+        response = self.client.post(
+            f'{BASE_URL}/api/passports',
+            content_type='application/json',
+            data=PASSPORT_DATA,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        # Пользователь для аутентификации и INSERT.
+        self.assertRequestQueries(response, 2)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        passport_id = response.data['id']
+
+        response = self.client.patch(
+            f'{BASE_URL}/api/passports/{passport_id}',
+            content_type='application/json',
+            data=PASSPORT_UPDATE_DATA,
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        # Пользователь в кэше: get и UPDATE, без проверки дубликата.
+        self.assertRequestQueries(response, 2)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertRequestQueries(response, 2)
+
+        with override_settings(QUERY_BUDGET_ACTION='raise'):
+            with patch.object(PassportAPIView, 'query_budget', {'GET': 0}):
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(
+                        f'{BASE_URL}/api/passports/{passport_id}',
+                        HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+                    )
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_request_profiling(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        superuser = User.objects.create_superuser(**SUPERUSER_DATA)
+        superuser.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        admin_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': SUPERUSER_DATA['username'],
+                'password': SUPERUSER_DATA['password']
+            })
+        ).data['token']
+
+        # Не staff: обычный ответ.
+        response = self.client.get(
+            f'{BASE_URL}/api/passports?profile=text',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        response = self.client.get(
+            f'{BASE_URL}/api/passports',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}',
+            HTTP_X_PROFILE='text'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profiled-Status'], '200')
+        self.assertIn('function calls', response.content.decode())
+
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILING_DIR=directory):
+                response = self.client.get(
+                    f'{BASE_URL}/api/passports?profile=1',
+                    HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(os.listdir(directory), [response['X-Profile-File']])
+
+        sampler.reset()
+        ident = sampler.enter()
+        sampler.sample()
+        sampler.exit(ident)
+
+        response = self.client.get(
+            f'{BASE_URL}/api/profiling/samples',
+            HTTP_AUTHORIZATION=f'Bearer {admin_token}'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        stack, count = response.content.decode().splitlines()[0].rsplit(' ', 1)
+        self.assertTrue(stack.endswith('test_views:test_request_profiling;small_app.profiling:sample'))
+        self.assertEqual(count, '1')
+
+        response = self.client.get(
+            f'{BASE_URL}/api/profiling/samples',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(PROFILING_SAMPLER_ENABLED=True)
+    def test_sampler_starts_in_worker(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        # Поток запущен в мастере (preload_app), запрос пришёл в воркер после fork.
+        master = threading.Thread(target=lambda: None)
+
+        with patch.object(sampler, 'thread', master), patch.object(sampler, 'pid', os.getpid() + 1):
+            response = self.client.get(
+                f'{BASE_URL}/api/users/current',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sampler.pid, os.getpid())
+            self.assertIsNot(sampler.thread, master)
+            self.assertTrue(sampler.thread.is_alive())
+            self.assertTrue(sampler.stats()['running'])
+
+    def test_metrics(self):
+
+        user = User.objects.create_user(**USER_DATA)
+        user.save()
+
+        auth_token = self.client.post(
+            f'{BASE_URL}/api/login',
+            content_type='application/json',
+            data=json.dumps({
+                'username': USER_DATA['username'],
+                'password': USER_DATA['password']
+            })
+        ).data['token']
+
+        self.client.get(
+            f'{BASE_URL}/api/passports',
+            HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+        )
+        self.client.get(
+            f'{BASE_URL}/api/passports',
+            HTTP_AUTHORIZATION=f'Bearer {get_random_string(12)}'
+        )
+
+        response = self.client.get(f'{BASE_URL}/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        text = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{view="small_app:passports",method="GET"}', text
+        )
+        self.assertIn(
+            'http_requests_total{view="small_app:passports",method="GET",status="200"}', text
+        )
+        self.assertIn('http_requests_total{view="small_app:passports",method="GET",status="403"}', text)
+        self.assertIn('jwt_authentications_total{outcome="success"}', text)
+        self.assertIn('jwt_authentications_total{outcome="decode_failure"}', text)
+        self.assertIn('password_hash_duration_seconds_count{operation="verify"}', text)
+        self.assertIn('db_queries_total{view="small_app:passports"}', text)
+        self.assertIn('cache_requests_total{cache="tokens",result="hit"}', text)
+
+        # Не из METRICS_ALLOWED_IPS: только с токеном.
+        response = self.client.get(f'{BASE_URL}/metrics', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+        with override_settings(METRICS_TOKEN='scrape-token'):
+            response = self.client.get(
+                f'{BASE_URL}/metrics', REMOTE_ADDR='203.0.113.7',
+                HTTP_AUTHORIZATION='Bearer scrape-token'
+            )
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get(
+                f'{BASE_URL}/metrics', REMOTE_ADDR='203.0.113.7',
+                HTTP_AUTHORIZATION=f'Bearer {auth_token}'
+            )
+            self.assertEqual(response.status_code, 403)
+
+        with override_settings(METRICS_ENABLED=False):
+            response = self.client.get(f'{BASE_URL}/metrics')
+
+        self.assertEqual(response.status_code, 404)
@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from small_app.views import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('small_app.urls', namespace='small_app'))
+    path('api/', include('small_app.urls', namespace='small_app')),
+    path('metrics', metrics_view, name='metrics'),
 ]